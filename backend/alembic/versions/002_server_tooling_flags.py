@@ -0,0 +1,39 @@
+"""Server tooling flags
+
+Revision ID: 002_server_tooling
+Revises: 001_initial
+Create Date: 2026-10-15
+
+"""
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '002_server_tooling'
+down_revision: str | None = '001_initial'
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'servers',
+        sa.Column('has_nginx', sa.Boolean(), nullable=False, server_default=sa.text('false')),
+    )
+    op.add_column(
+        'servers',
+        sa.Column('has_certbot', sa.Boolean(), nullable=False, server_default=sa.text('false')),
+    )
+    op.add_column(
+        'servers',
+        sa.Column('has_git', sa.Boolean(), nullable=False, server_default=sa.text('false')),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('servers', 'has_git')
+    op.drop_column('servers', 'has_certbot')
+    op.drop_column('servers', 'has_nginx')
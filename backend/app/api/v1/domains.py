@@ -75,6 +75,10 @@ async def issue_ssl_endpoint(
     if not domain:
         raise HTTPException(status_code=404, detail="Domain not found")
     await _verify_instance_ownership(domain.instance_id, db, current_user)
+    # Committed before queueing, so a fast worker's outcome is never
+    # overwritten by this request
+    domain.ssl_status = "pending"
+    await db.commit()
     task = issue_ssl_cert.delay(domain.id)
     await create_task_log(db, task.id, current_user, "issue_ssl", domain.id, "domain")
     return TaskTriggerResponse(task_id=task.id, message="SSL certificate issuance started")
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.database import get_db
@@ -67,6 +67,10 @@ async def create_and_deploy_instance(
 ):
     server = await _verify_server_ownership(server_id, db, current_user)
     instance = await create_instance(db, server, data)
+    # Committed before queueing, so a fast worker's outcome is never
+    # overwritten by this request
+    instance.status = "deploying"
+    await db.commit()
     task = deploy_odoo_instance.delay(instance.id)
     await create_task_log(db, task.id, current_user, "deploy_instance", instance.id, "instance")
     return TaskTriggerResponse(task_id=task.id, message="Odoo instance deployment started")
@@ -116,6 +120,10 @@ async def redeploy_instance(
     current_user: User = Depends(get_current_user),
 ):
     instance = await _verify_instance_ownership(instance_id, db, current_user)
+    # Committed before queueing, so a fast worker's outcome is never
+    # overwritten by this request
+    instance.status = "deploying"
+    await db.commit()
     task = deploy_odoo_instance.delay(instance.id)
     await create_task_log(db, task.id, current_user, "deploy_instance", instance.id, "instance")
     return TaskTriggerResponse(task_id=task.id, message="Redeployment started")
@@ -160,7 +168,7 @@ async def restart_instance(
 @router.get("/instances/{instance_id}/logs", response_model=TaskTriggerResponse)
 async def get_instance_logs(
     instance_id: int,
-    tail: int = 200,
+    tail: int = Query(200, ge=1, le=10000),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
@@ -1,9 +1,22 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool
 
 from app.core.config import settings
 
-sync_engine = create_engine(settings.DATABASE_URL_SYNC, echo=False)
+# Shared by every task in a worker process; pre-ping drops connections the
+# server closed while the worker sat idle between beat ticks.  Sized for the
+# thread-pool worker, where each running task holds two sessions (its own and
+# update_task_log's).
+sync_engine = create_engine(
+    settings.DATABASE_URL_SYNC,
+    echo=False,
+    poolclass=QueuePool,
+    pool_size=10,
+    max_overflow=10,
+    pool_pre_ping=True,
+    pool_recycle=300,
+)
 SyncSession = sessionmaker(sync_engine, class_=Session, expire_on_commit=False)
 
 
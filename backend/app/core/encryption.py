@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 from cryptography.fernet import Fernet
 
 from app.core.config import settings
@@ -13,3 +15,13 @@ def encrypt_value(plaintext: str) -> str:
 def decrypt_value(ciphertext: str) -> str:
     """Decrypt a Fernet token back to the original string."""
     return _fernet.decrypt(ciphertext.encode()).decode()
+
+
+@lru_cache(maxsize=256)
+def decrypt_value_cached(ciphertext: str) -> str:
+    """``decrypt_value`` memoised per process, for secrets read on every task.
+
+    Keyed on the token itself, so re-encrypting a value (e.g. a rotated SSH
+    key) simply misses the cache.
+    """
+    return decrypt_value(ciphertext)
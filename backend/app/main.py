@@ -13,7 +13,7 @@ from app.core.config import settings
 from app.core.database import async_session
 from app.core.exceptions import register_exception_handlers
 from app.core.logging import setup_logging
-from app.core.security import hash_password
+from app.core.security import hash_password_async
 from app.models.user import User
 
 # Initialize structured logging before anything else
@@ -31,7 +31,7 @@ async def seed_admin_user():
             if result.scalar_one_or_none() is None:
                 admin = User(
                     email=settings.ADMIN_EMAIL,
-                    hashed_password=hash_password(settings.ADMIN_PASSWORD),
+                    hashed_password=await hash_password_async(settings.ADMIN_PASSWORD),
                 )
                 db.add(admin)
                 await db.commit()
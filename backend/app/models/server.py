@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import BigInteger, DateTime, ForeignKey, Integer, String, Text
+from sqlalchemy import BigInteger, Boolean, DateTime, ForeignKey, Integer, String, Text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.models.base import Base, TimestampMixin
@@ -25,5 +25,11 @@ class Server(TimestampMixin, Base):
     disk_total_bytes: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
     docker_version: Mapped[str | None] = mapped_column(String(50), nullable=True)
 
+    # Tooling known to be installed (set by server.install_deps or the first
+    # task that installs it) so tasks can skip their per-run checks
+    has_nginx: Mapped[bool] = mapped_column(Boolean, default=False)
+    has_certbot: Mapped[bool] = mapped_column(Boolean, default=False)
+    has_git: Mapped[bool] = mapped_column(Boolean, default=False)
+
     owner: Mapped["User"] = relationship(back_populates="servers")
     instances: Mapped[list["OdooInstance"]] = relationship(back_populates="server", cascade="all, delete-orphan")
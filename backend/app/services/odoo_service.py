@@ -9,10 +9,15 @@ from app.models.server import Server
 from app.schemas.odoo_instance import InstanceCreate, InstanceUpdate
 
 
+# Any run of characters outside [a-z0-9_] — dashes included — collapses to a
+# single dash, which is what replacing unsafe chars and then squeezing
+# repeated dashes did in two passes.
+_CONTAINER_NAME_UNSAFE_RE = re.compile(r"[^a-z0-9_]+")
+
+
 def _generate_container_name(name: str, server_id: int) -> str:
     """Generate a safe Docker container name from instance name."""
-    safe = re.sub(r"[^a-z0-9_-]", "-", name.lower().strip())
-    safe = re.sub(r"-+", "-", safe).strip("-")
+    safe = _CONTAINER_NAME_UNSAFE_RE.sub("-", name.lower().strip()).strip("-")
     return f"odoo-{safe}-s{server_id}"
 
 
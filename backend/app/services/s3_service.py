@@ -4,12 +4,25 @@ import logging
 from typing import BinaryIO
 
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
 
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Multipart settings shared by transfers: objects under the threshold move in
+# a single request, larger ones as 16 MB parts (or ranged GETs) in parallel.
+_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=16 * 1024 * 1024,
+    max_concurrency=8,
+    use_threads=True,
+)
+
+# S3 DeleteObjects accepts at most this many keys per request
+_DELETE_BATCH_SIZE = 1000
+
 
 def _get_s3_client():
     """Create a boto3 S3 client from application settings."""
@@ -41,7 +54,7 @@ def upload_file_to_s3(
     """
     client = _get_s3_client()
     logger.info("Uploading %s -> s3://%s/%s", local_path, bucket, s3_key)
-    client.upload_file(local_path, bucket, s3_key)
+    client.upload_file(local_path, bucket, s3_key, Config=_TRANSFER_CONFIG)
     uri = f"s3://{bucket}/{s3_key}"
     logger.info("Upload complete: %s", uri)
     return uri
@@ -64,7 +77,7 @@ def upload_fileobj_to_s3(
     """
     client = _get_s3_client()
     logger.info("Uploading stream -> s3://%s/%s", bucket, s3_key)
-    client.upload_fileobj(file_obj, bucket, s3_key)
+    client.upload_fileobj(file_obj, bucket, s3_key, Config=_TRANSFER_CONFIG)
     uri = f"s3://{bucket}/{s3_key}"
     logger.info("Upload complete: %s", uri)
     return uri
@@ -87,7 +100,7 @@ def download_file_from_s3(
     """
     client = _get_s3_client()
     logger.info("Downloading s3://%s/%s -> %s", bucket, s3_key, local_path)
-    client.download_file(bucket, s3_key, local_path)
+    client.download_file(bucket, s3_key, local_path, Config=_TRANSFER_CONFIG)
     logger.info("Download complete: %s", local_path)
     return local_path
 
@@ -112,6 +125,38 @@ def delete_from_s3(bucket: str, s3_key: str) -> bool:
         return False
 
 
+def bulk_delete_from_s3(bucket: str, s3_keys: list[str]) -> set[str]:
+    """Delete many objects from one bucket, up to 1000 keys per request.
+
+    Args:
+        bucket: S3 bucket name.
+        s3_keys: Object keys to delete.
+
+    Returns:
+        The keys that were deleted (or didn't exist).
+    """
+    client = _get_s3_client()
+    deleted: set[str] = set()
+    for start in range(0, len(s3_keys), _DELETE_BATCH_SIZE):
+        batch = s3_keys[start:start + _DELETE_BATCH_SIZE]
+        try:
+            logger.info("Deleting %d objects from s3://%s", len(batch), bucket)
+            resp = client.delete_objects(
+                Bucket=bucket,
+                Delete={"Objects": [{"Key": k} for k in batch], "Quiet": True},
+            )
+        except ClientError as e:
+            logger.error("Failed to delete batch from s3://%s: %s", bucket, e)
+            continue
+        failed = {err["Key"] for err in resp.get("Errors", [])}
+        for err in resp.get("Errors", []):
+            logger.error(
+                "Failed to delete s3://%s/%s: %s", bucket, err["Key"], err.get("Message")
+            )
+        deleted.update(k for k in batch if k not in failed)
+    return deleted
+
+
 def get_s3_object_size(bucket: str, s3_key: str) -> int | None:
     """Get the size of an S3 object in bytes, or None if not found."""
     client = _get_s3_client()
@@ -48,6 +48,9 @@ async def update_server(db: AsyncSession, server: Server, data: ServerUpdate) ->
         server.ssh_user = data.ssh_user
     if data.ssh_key is not None:
         server.ssh_key_encrypted = encrypt_value(data.ssh_key)
+    if any(v is not None for v in (data.host, data.port, data.ssh_user, data.ssh_key)):
+        # The last connection test no longer says anything about these details
+        server.status = "unknown"
     await db.commit()
     await db.refresh(server)
     return server
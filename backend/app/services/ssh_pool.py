@@ -0,0 +1,192 @@
+"""Per-process pool of authenticated SSH connections for Celery workers.
+
+Each task used to open its own ``SSHService`` and pay a full TCP + SSH
+handshake.  The pool keeps one connection per ``(host, port, user, key)`` alive
+between tasks in the same worker process and hands it out again, dropping it
+once it has been idle for ``IDLE_TIMEOUT`` seconds or its transport has died.
+"""
+
+import hashlib
+import logging
+import random
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+import paramiko
+
+from app.core.encryption import decrypt_value_cached
+from app.models.server import Server
+from app.services.ssh_service import SSHService
+
+logger = logging.getLogger(__name__)
+
+KEEPALIVE_INTERVAL = 30  # seconds between SSH keepalive packets
+IDLE_TIMEOUT = 300  # seconds before an unused connection is closed
+CONNECT_ATTEMPTS = 3  # tries per new connection before giving up
+CONNECT_BACKOFF_MAX = 8  # cap, in seconds, on the random delay between tries
+
+_PoolKey = tuple[str, int, str, bytes]
+
+_lock = threading.Lock()
+_connections: dict[_PoolKey, SSHService] = {}
+_last_used: dict[_PoolKey, float] = {}
+# Checkouts currently holding each connection, pooled or already detached.
+# Only a connection with no holders is ever closed.
+_in_use: dict[SSHService, int] = {}
+
+
+def _pool_key(server: Server) -> _PoolKey:
+    # The key fingerprint makes a rotated SSH key open a fresh connection
+    fingerprint = hashlib.blake2b(
+        server.ssh_key_encrypted.encode(), digest_size=8
+    ).digest()
+    return (server.host, server.port, server.ssh_user, fingerprint)
+
+
+def _evict_idle(now: float) -> list[SSHService]:
+    """Remove idle or dead connections from the pool. Caller holds ``_lock``.
+
+    Returns the ones nobody holds, for the caller to close.  A dead connection
+    still in use is only detached; its last holder closes it on release.
+    """
+    stale = [
+        key for key, ssh in _connections.items()
+        if not ssh.is_connected()
+        or (ssh not in _in_use and now - _last_used[key] > IDLE_TIMEOUT)
+    ]
+    evicted = []
+    for key in stale:
+        ssh = _connections.pop(key)
+        del _last_used[key]
+        if ssh not in _in_use:
+            evicted.append(ssh)
+    return evicted
+
+
+def _hold(key: _PoolKey, ssh: SSHService) -> None:
+    """Count a checkout of ``ssh``. Caller holds ``_lock``."""
+    _in_use[ssh] = _in_use.get(ssh, 0) + 1
+    _last_used[key] = time.monotonic()
+
+
+def _release(key: _PoolKey, ssh: SSHService, broken: bool) -> None:
+    """End a checkout of ``ssh``, closing it if it is unpooled and now unheld.
+
+    A ``broken`` connection is detached from the pool straight away so no new
+    caller picks it up, but stays open until its other holders are done.
+    """
+    with _lock:
+        pooled = _connections.get(key) is ssh
+        if broken and pooled:
+            del _connections[key]
+            del _last_used[key]
+            pooled = False
+        elif pooled:
+            _last_used[key] = time.monotonic()
+        _in_use[ssh] -= 1
+        if _in_use[ssh]:
+            return
+        del _in_use[ssh]
+    if not pooled:
+        ssh.close()
+
+
+def _connect(server: Server) -> SSHService:
+    """Open a new connection, retrying transient failures with full jitter.
+
+    sshd drops handshakes beyond its ``MaxStartups`` limit, so many workers
+    reconnecting to one host at once back off by a random delay instead of
+    retrying in lockstep.  Authentication and host key errors are not retried.
+    """
+    ssh = SSHService(
+        host=server.host,
+        port=server.port,
+        username=server.ssh_user,
+        private_key_pem=decrypt_value_cached(server.ssh_key_encrypted),
+    )
+    # A key that doesn't parse is a permanent error: surface it before retrying
+    SSHService._parse_private_key(ssh.private_key_pem)
+    for attempt in range(CONNECT_ATTEMPTS - 1):
+        try:
+            ssh.connect()
+            return ssh
+        except (paramiko.AuthenticationException, paramiko.BadHostKeyException):
+            ssh.close()
+            raise
+        except (paramiko.SSHException, OSError) as e:
+            ssh.close()
+            delay = random.uniform(0, min(CONNECT_BACKOFF_MAX, 2 ** attempt))
+            logger.warning(
+                "SSH pool: connect to %s:%d failed (%s); retrying in %.1fs",
+                server.host, server.port, e, delay,
+            )
+            time.sleep(delay)
+    ssh.connect()
+    return ssh
+
+
+def _checkout(key: _PoolKey, server: Server) -> SSHService:
+    with _lock:
+        evicted = _evict_idle(time.monotonic())
+        ssh = _connections.get(key)
+        if ssh is not None:
+            _hold(key, ssh)
+    for old in evicted:
+        old.close()
+    if ssh is not None:
+        return ssh
+
+    # Connect outside the lock so a slow host doesn't block the others
+    ssh = _connect(server)
+    ssh.set_keepalive(KEEPALIVE_INTERVAL)
+    logger.info(
+        "SSH pool: opened connection to %s@%s:%d", server.ssh_user, server.host, server.port
+    )
+
+    with _lock:
+        existing = _connections.get(key)
+        if existing is None:
+            _connections[key] = ssh
+        else:
+            # Another thread connected first; use its connection
+            ssh, existing = existing, ssh
+        _hold(key, ssh)
+    if existing is not None:
+        existing.close()
+    return ssh
+
+
+@contextmanager
+def acquire(server: Server) -> Iterator[SSHService]:
+    """Yield a connected ``SSHService`` for ``server``, reusing a pooled one.
+
+    Several threads may hold the same connection at once.  It stays open
+    afterwards; if the block raises an SSH error or the transport turns out
+    to be dead, it is dropped from the pool so the next caller reconnects,
+    and closed once the last holder releases it.
+    """
+    key = _pool_key(server)
+    ssh = _checkout(key, server)
+    broken = False
+    try:
+        yield ssh
+    except Exception as e:
+        broken = isinstance(e, paramiko.SSHException) or not ssh.is_connected()
+        raise
+    finally:
+        _release(key, ssh, broken)
+
+
+def close_all() -> None:
+    """Close every pooled connection (called on worker process shutdown).
+
+    Connections still checked out are only detached; their holders close them.
+    """
+    with _lock:
+        idle = [ssh for ssh in _connections.values() if ssh not in _in_use]
+        _connections.clear()
+        _last_used.clear()
+    for ssh in idle:
+        ssh.close()
@@ -1,10 +1,35 @@
+import functools
+import hashlib
 import io
 import logging
+import os
+import secrets
+import shlex
+import shutil
+import socket
+import subprocess
+import tempfile
+from collections.abc import Iterator
+from contextlib import contextmanager
 
 import paramiko
 
 logger = logging.getLogger(__name__)
 
+# Bulk transfers shell out to OpenSSH's scp, which runs the cipher in native
+# (AES-NI accelerated) code instead of paramiko's Python transport.  The
+# ControlMaster socket lets back-to-back transfers to one host share a login;
+# it is keyed by the private key too, so a rotated key never reuses a master
+# that logged in with the old one.
+_SCP_CIPHER = "aes128-gcm@openssh.com"
+_SCP_CONTROL_PATH = os.path.join(tempfile.gettempdir(), "cloudtab-ssh-{key}-%C")
+
+# SFTP tuning: a wide channel window keeps many requests in flight, and
+# copies move through a 1 MB buffer instead of 32 KB blocks.
+_SFTP_WINDOW_SIZE = 4 * 1024 * 1024
+_SFTP_MAX_PACKET_SIZE = 32768
+_COPY_BUFFER_SIZE = 1024 * 1024
+
 
 class SSHService:
     """Wrapper around paramiko.SSHClient for executing commands on remote servers."""
@@ -33,10 +58,20 @@ class SSHService:
             allow_agent=False,
             look_for_keys=False,
         )
+        # Commands and their replies are small packets; don't let Nagle hold
+        # them back waiting for the peer's delayed ACK
+        self._client.get_transport().sock.setsockopt(
+            socket.IPPROTO_TCP, socket.TCP_NODELAY, 1
+        )
 
     @staticmethod
+    @functools.lru_cache(maxsize=256)
     def _parse_private_key(pem: str) -> paramiko.PKey:
-        """Parse a PEM-encoded private key, trying multiple key types."""
+        """Parse a PEM-encoded private key, trying multiple key types.
+
+        Parsed keys are cached per PEM: loading one costs an ASN.1 decode and
+        key validation, and a worker reconnects with the same few keys.
+        """
         key_file = io.StringIO(pem)
         key_classes = [
             paramiko.RSAKey,
@@ -51,7 +86,8 @@ class SSHService:
             except (paramiko.SSHException, ValueError) as e:
                 last_error = e
                 continue
-        raise paramiko.SSHException(f"Unable to parse private key: {last_error}")
+        # ValueError, not SSHException: a bad key is permanent, never retried
+        raise ValueError(f"Unable to parse private key: {last_error}") from last_error
 
     def execute(self, command: str, timeout: int = 30) -> tuple[str, str, int]:
         """Execute a command on the remote server.
@@ -70,6 +106,96 @@ class SSHService:
             exit_code,
         )
 
+    def execute_script(
+        self, script: str, stdin: str = "", timeout: int = 30
+    ) -> tuple[str, str, int]:
+        """Run a multi-line bash script over a single SSH channel.
+
+        The script runs under ``bash -e``, so it stops at the first failing
+        command.  ``stdin`` is fed to the script (e.g. a config file body for
+        ``cat > file``), which avoids shell-escaping the payload.
+
+        Returns:
+            Tuple of (stdout, stderr, exit_code)
+        """
+        if self._client is None:
+            raise RuntimeError("SSH client is not connected. Call connect() first.")
+
+        chan_stdin, stdout, stderr = self._client.exec_command(
+            f"bash -ec {shlex.quote(script)}", timeout=timeout
+        )
+        if stdin:
+            chan_stdin.write(stdin)
+        chan_stdin.channel.shutdown_write()
+        exit_code = stdout.channel.recv_exit_status()
+        return (
+            stdout.read().decode("utf-8", errors="replace").strip(),
+            stderr.read().decode("utf-8", errors="replace").strip(),
+            exit_code,
+        )
+
+    def execute_many(
+        self, commands: list[str], timeout: int = 30
+    ) -> list[tuple[str, str, int]]:
+        """Run independent commands back to back over a single SSH channel.
+
+        Unlike ``execute_script``, a failing command doesn't stop the rest;
+        each one gets its own output and exit code, as if run via ``execute``.
+        ``timeout`` covers the whole batch.
+
+        Returns:
+            One (stdout, stderr, exit_code) tuple per command, in order.
+        """
+        # A random marker frames each command's output so it can't collide
+        # with anything the commands print
+        mark = f"__CT_{secrets.token_hex(8)}__"
+        lines = ['ct_err=$(mktemp)', 'trap \'rm -f "$ct_err"\' EXIT']
+        for command in commands:
+            lines += [
+                f'( {command}\n) 2> "$ct_err" < /dev/null && ct_rc=0 || ct_rc=$?',
+                f"printf '\\n{mark} %d\\n' \"$ct_rc\"",
+                'cat "$ct_err"',
+                f"printf '\\n{mark}\\n'",
+            ]
+        stdout, stderr, exit_code = self.execute_script("\n".join(lines), timeout=timeout)
+        if exit_code != 0:
+            raise RuntimeError(f"Command batch failed ({exit_code}): {stderr}")
+
+        results = []
+        rest = "\n" + stdout + "\n"
+        for _ in commands:
+            out, _, rest = rest.partition(f"\n{mark} ")
+            code, _, rest = rest.partition("\n")
+            err, _, rest = rest.partition(f"\n{mark}\n")
+            results.append((out.strip(), err.strip(), int(code)))
+        return results
+
+    @contextmanager
+    def stream_command(
+        self, command: str, timeout: int | None = None
+    ) -> Iterator[paramiko.ChannelFile]:
+        """Run a command and yield its stdout as a readable byte stream.
+
+        Once the block finishes, waits for the command to exit and raises
+        ``RuntimeError`` with its stderr if the exit code is non-zero.
+
+        Args:
+            command: Shell command to run on the remote server.
+            timeout: Seconds to wait for each read before giving up.
+        """
+        if self._client is None:
+            raise RuntimeError("SSH client is not connected. Call connect() first.")
+        _, stdout, stderr = self._client.exec_command(command, timeout=timeout)
+        try:
+            yield stdout
+        except BaseException:
+            stdout.channel.close()
+            raise
+        exit_code = stdout.channel.recv_exit_status()
+        if exit_code != 0:
+            err = stderr.read().decode("utf-8", errors="replace").strip()
+            raise RuntimeError(f"Command exited with {exit_code}: {err}")
+
     def download_file(self, remote_path: str, local_path: str) -> None:
         """Download a file from the remote server via SFTP.
 
@@ -77,12 +203,12 @@ class SSHService:
             remote_path: Absolute path on the remote server.
             local_path: Local file path to write to.
         """
-        if self._client is None:
-            raise RuntimeError("SSH client is not connected. Call connect() first.")
-        sftp = self._client.open_sftp()
+        sftp = self._open_sftp()
         try:
             logger.info("SFTP download: %s -> %s", remote_path, local_path)
-            sftp.get(remote_path, local_path)
+            with sftp.open(remote_path, "rb") as src, open(local_path, "wb") as dst:
+                src.prefetch()
+                shutil.copyfileobj(src, dst, _COPY_BUFFER_SIZE)
         finally:
             sftp.close()
 
@@ -93,15 +219,83 @@ class SSHService:
             local_path: Local file path to read from.
             remote_path: Absolute path on the remote server.
         """
-        if self._client is None:
-            raise RuntimeError("SSH client is not connected. Call connect() first.")
-        sftp = self._client.open_sftp()
+        sftp = self._open_sftp()
         try:
             logger.info("SFTP upload: %s -> %s", local_path, remote_path)
-            sftp.put(local_path, remote_path)
+            with open(local_path, "rb") as src, sftp.open(remote_path, "wb") as dst:
+                dst.set_pipelined(True)
+                shutil.copyfileobj(src, dst, _COPY_BUFFER_SIZE)
         finally:
             sftp.close()
 
+    def _open_sftp(self) -> paramiko.SFTPClient:
+        if self._client is None:
+            raise RuntimeError("SSH client is not connected. Call connect() first.")
+        return paramiko.SFTPClient.from_transport(
+            self._client.get_transport(),
+            window_size=_SFTP_WINDOW_SIZE,
+            max_packet_size=_SFTP_MAX_PACKET_SIZE,
+        )
+
+    def bulk_upload(self, local_path: str, remote_path: str, timeout: int = 3600) -> None:
+        """Upload a large file with native scp, falling back to SFTP."""
+        if shutil.which("scp") is None:
+            self.upload_file(local_path, remote_path)
+            return
+        logger.info("scp upload: %s -> %s", local_path, remote_path)
+        try:
+            self._scp(local_path, f"{self.username}@{self.host}:{remote_path}", timeout)
+        except RuntimeError as e:
+            # e.g. an sshd that doesn't offer the forced cipher
+            logger.warning("scp upload failed (%s); falling back to SFTP", e)
+            self.upload_file(local_path, remote_path)
+
+    def _scp(self, source: str, target: str, timeout: int) -> None:
+        key_id = hashlib.blake2b(self.private_key_pem.encode(), digest_size=8).hexdigest()
+        control_path = _SCP_CONTROL_PATH.format(key=key_id)
+        # mkstemp creates the file 0600, as ssh requires for identity files
+        fd, key_path = tempfile.mkstemp(prefix="cloudtab-key-")
+        try:
+            with os.fdopen(fd, "w") as key_file:
+                key_file.write(self.private_key_pem.rstrip("\n") + "\n")
+            proc = subprocess.run(
+                [
+                    "scp", "-q", "-B",
+                    "-P", str(self.port),
+                    "-c", _SCP_CIPHER,
+                    "-i", key_path,
+                    "-o", "IdentitiesOnly=yes",
+                    "-o", "StrictHostKeyChecking=no",
+                    "-o", "UserKnownHostsFile=/dev/null",
+                    "-o", "ControlMaster=auto",
+                    "-o", f"ControlPath={control_path}",
+                    "-o", "ControlPersist=60",
+                    source,
+                    target,
+                ],
+                capture_output=True,
+                text=True,
+                timeout=timeout,
+                check=False,
+            )
+        finally:
+            os.remove(key_path)
+        if proc.returncode != 0:
+            raise RuntimeError(f"scp failed: {proc.stderr.strip()}")
+
+    def is_connected(self) -> bool:
+        """Return True while the underlying transport is open."""
+        if self._client is None:
+            return False
+        transport = self._client.get_transport()
+        return transport is not None and transport.is_active()
+
+    def set_keepalive(self, interval: int) -> None:
+        """Send a keepalive packet every ``interval`` seconds."""
+        if self._client is None:
+            raise RuntimeError("SSH client is not connected. Call connect() first.")
+        self._client.get_transport().set_keepalive(interval)
+
     def close(self) -> None:
         """Close the SSH connection."""
         if self._client:
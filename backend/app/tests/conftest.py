@@ -2,41 +2,95 @@
 Shared fixtures for CloudTab test suite.
 
 Uses an in-memory SQLite database via aiosqlite for fast, isolated tests.
-Each test function gets its own database session that is rolled back after the test.
+The schema is created once per session; each test runs inside an outer
+transaction that is rolled back afterwards, with service-level commits turned
+into SAVEPOINTs so they never escape the test.
 """
 
 import asyncio
+import base64
+import os
 from collections.abc import AsyncGenerator
 
 import pytest
 import pytest_asyncio
 from httpx import ASGITransport, AsyncClient
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
-
+from sqlalchemy import event, insert
+from sqlalchemy.ext.asyncio import (
+    AsyncConnection,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.pool import StaticPool
+
+# Shared-cache in-memory SQLite: no fsync, no page cache, no sockets.  Point
+# the app at it before anything under ``app`` builds its engines.  Under
+# pytest-xdist each worker gets its own named database (cloudtab_test_gw0, ...).
+_XDIST_WORKER = os.environ.get("PYTEST_XDIST_WORKER", "main")
+TEST_DATABASE_URL = (
+    f"sqlite+aiosqlite:///file:cloudtab_test_{_XDIST_WORKER}"
+    "?mode=memory&cache=shared&uri=true"
+)
+os.environ.setdefault("DATABASE_URL", TEST_DATABASE_URL)
+
+# Test-only Fernet key: a fixed, already-encoded 32-byte key so the app's
+# module-level Fernet is built straight from raw key material.  Never use
+# this outside the test suite.
+os.environ["ENCRYPTION_KEY"] = base64.urlsafe_b64encode(b"\x00" * 32).decode()
+
+from app.core.config import settings
 from app.core.security import create_access_token, hash_password
 from app.models.base import Base
 
+# Settings only knows how to derive a sync URL for Postgres; give the worker
+# modules' sync engine the plain pysqlite driver for the same test database
+settings.DATABASE_URL_SYNC = settings.DATABASE_URL.replace("+aiosqlite", "", 1)
+
 # ---------------------------------------------------------------------------
 # Async event loop
 # ---------------------------------------------------------------------------
 
 @pytest.fixture(scope="session")
-def event_loop():
-    """Create a single event loop for all tests."""
-    loop = asyncio.new_event_loop()
-    yield loop
-    loop.close()
+def event_loop_policy():
+    """Run the session-wide event loop on uvloop when it is installed.
+
+    Tests and fixtures all share one loop via the session loop scopes set in
+    ``pyproject.toml``.
+    """
+    try:
+        import uvloop
+    except ImportError:
+        return asyncio.DefaultEventLoopPolicy()
+    return uvloop.EventLoopPolicy()
 
 
 # ---------------------------------------------------------------------------
 # Database engine & session  (SQLite in-memory, per-session)
 # ---------------------------------------------------------------------------
 
-TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
-
 @pytest_asyncio.fixture(scope="session")
 async def engine():
-    eng = create_async_engine(TEST_DATABASE_URL, echo=False)
+    # StaticPool hands out the same connection every time, so every session
+    # sees the one in-memory database the schema was created in.
+    eng = create_async_engine(
+        TEST_DATABASE_URL,
+        echo=False,
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+
+    # pysqlite/aiosqlite defer BEGIN on their own, which breaks SAVEPOINT
+    # semantics; take over transaction control so the per-test outer
+    # transaction really wraps everything the test does.
+    @event.listens_for(eng.sync_engine, "connect")
+    def _disable_driver_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(eng.sync_engine, "begin")
+    def _emit_begin(conn):
+        conn.exec_driver_sql("BEGIN")
+
     async with eng.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
     yield eng
@@ -45,92 +99,204 @@ async def engine():
     await eng.dispose()
 
 
+@pytest.fixture(scope="session")
+def session_factory() -> async_sessionmaker[AsyncSession]:
+    """Session factory shared by every test; each test binds it to its own connection."""
+    return async_sessionmaker(
+        class_=AsyncSession,
+        expire_on_commit=False,
+        join_transaction_mode="create_savepoint",
+    )
+
+
+@pytest_asyncio.fixture(scope="class")
+async def connection(engine) -> AsyncGenerator[AsyncConnection, None]:
+    """
+    One connection per test class, holding an outer transaction that is
+    rolled back when the class finishes.  Class-scoped seed rows live in this
+    transaction; each test nests a SAVEPOINT inside it.
+    """
+    async with engine.connect() as conn:
+        trans = await conn.begin()
+        yield conn
+        await trans.rollback()
+
+
 @pytest_asyncio.fixture()
-async def db(engine) -> AsyncGenerator[AsyncSession, None]:
-    """Per-test database session. Rolls back after each test for isolation."""
-    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
-    async with session_factory() as session:
-        async with session.begin():
-            yield session
-        # Rollback any uncommitted changes after the test
-        await session.rollback()
+async def db(
+    connection: AsyncConnection, session_factory: async_sessionmaker[AsyncSession]
+) -> AsyncGenerator[AsyncSession, None]:
+    """Per-test database session. Rolls back after each test for isolation.
+
+    The test runs inside a SAVEPOINT on the class connection, and
+    ``join_transaction_mode="create_savepoint"`` makes every ``commit()``
+    issued by the services release a nested SAVEPOINT instead of committing
+    for real.  Rolling back the test's SAVEPOINT discards everything the test
+    did — including updates and deletes of the class-scoped seed rows.
+    """
+    savepoint = await connection.begin_nested()
+    async with session_factory(bind=connection) as session:
+        yield session
+    if savepoint.is_active:
+        await savepoint.rollback()
 
 
 # ---------------------------------------------------------------------------
 # Seed user helper
 # ---------------------------------------------------------------------------
 
-@pytest_asyncio.fixture()
-async def test_user(db: AsyncSession):
-    """Create and return a test user."""
+@pytest.fixture(scope="session")
+def test_user_password_hash() -> str:
+    """bcrypt hash of the test user's password, computed once per session."""
+    return hash_password("testpass123")
+
+
+@pytest.fixture(scope="module")
+def fast_password_hashing():
+    """
+    Swap the app's bcrypt context for a minimum-cost one (4 rounds).
+
+    Opt in per module with ``pytestmark = pytest.mark.usefixtures(...)``;
+    the security tests keep the real cost factor.  Hashes produced here still
+    verify normally since bcrypt encodes the round count in the hash.
+    """
+    from passlib.context import CryptContext
+
+    from app.core import security
+
+    mp = pytest.MonkeyPatch()
+    mp.setattr(security, "pwd_context", CryptContext(schemes=["bcrypt"], bcrypt__rounds=4))
+    yield
+    mp.undo()
+
+
+@pytest_asyncio.fixture(scope="class")
+async def test_user_id(connection: AsyncConnection, test_user_password_hash: str) -> int:
+    """Insert the test user once per class and return its id."""
     from app.models.user import User
 
-    user = User(
-        email="test@cloudtab.local",
-        hashed_password=hash_password("testpass123"),
+    result = await connection.execute(
+        insert(User)
+        .values(email="test@cloudtab.local", hashed_password=test_user_password_hash)
+        .returning(User.id)
     )
-    db.add(user)
-    await db.flush()
-    return user
+    return result.scalar_one()
 
 
 @pytest_asyncio.fixture()
-def auth_token(test_user) -> str:
-    """Return a valid JWT access token for the test user."""
-    return create_access_token(str(test_user.id))
+async def test_user(db: AsyncSession, test_user_id: int):
+    """Return the class's test user, loaded into this test's session."""
+    from app.models.user import User
+
+    return await db.get(User, test_user_id)
+
+
+@pytest.fixture(scope="session")
+def _access_tokens() -> dict[int, str]:
+    """Session-wide cache of signed access tokens, keyed by user id."""
+    return {}
+
+
+@pytest.fixture()
+def auth_token(test_user_id: int, _access_tokens: dict[int, str]) -> str:
+    """Return a valid JWT access token for the test user, signed once per session."""
+    if test_user_id not in _access_tokens:
+        _access_tokens[test_user_id] = create_access_token(str(test_user_id))
+    return _access_tokens[test_user_id]
 
 
 # ---------------------------------------------------------------------------
 # Test server + instance helpers
 # ---------------------------------------------------------------------------
 
-@pytest_asyncio.fixture()
-async def test_server(db: AsyncSession, test_user):
-    """Create and return a test server."""
+@pytest_asyncio.fixture(scope="class")
+async def test_server_id(connection: AsyncConnection, test_user_id: int) -> int:
+    """Insert the test server once per class and return its id."""
     from app.core.encryption import encrypt_value
     from app.models.server import Server
 
-    server = Server(
-        owner_id=test_user.id,
-        name="Test Server",
-        host="192.168.1.100",
-        port=22,
-        ssh_user="root",
-        ssh_key_encrypted=encrypt_value("fake-ssh-key"),
+    result = await connection.execute(
+        insert(Server)
+        .values(
+            owner_id=test_user_id,
+            name="Test Server",
+            host="192.168.1.100",
+            port=22,
+            ssh_user="root",
+            ssh_key_encrypted=encrypt_value("fake-ssh-key"),
+        )
+        .returning(Server.id)
     )
-    db.add(server)
-    await db.flush()
-    return server
+    return result.scalar_one()
 
 
 @pytest_asyncio.fixture()
-async def test_instance(db: AsyncSession, test_server):
-    """Create and return a test Odoo instance."""
+async def test_server(db: AsyncSession, test_server_id: int):
+    """Return the class's test server, loaded into this test's session."""
+    from app.models.server import Server
+
+    return await db.get(Server, test_server_id)
+
+
+@pytest_asyncio.fixture(scope="class")
+async def test_instance_id(connection: AsyncConnection, test_server_id: int) -> int:
+    """Insert the test Odoo instance once per class and return its id."""
     from app.models.odoo_instance import OdooInstance
 
-    instance = OdooInstance(
-        server_id=test_server.id,
-        name="Test Instance",
-        odoo_version="17.0",
-        edition="community",
-        container_name="odoo-test-s1",
-        host_port=8069,
-        pg_container_name="odoo-test-s1-db",
-        pg_port=9069,
-        pg_password="odoo",
-        addons_path="/opt/cloudtab/odoo-test-s1/addons",
+    result = await connection.execute(
+        insert(OdooInstance)
+        .values(
+            server_id=test_server_id,
+            name="Test Instance",
+            odoo_version="17.0",
+            edition="community",
+            container_name="odoo-test-s1",
+            host_port=8069,
+            pg_container_name="odoo-test-s1-db",
+            pg_port=9069,
+            pg_password="odoo",
+            addons_path="/opt/cloudtab/odoo-test-s1/addons",
+        )
+        .returning(OdooInstance.id)
     )
-    db.add(instance)
-    await db.flush()
-    return instance
+    return result.scalar_one()
+
+
+@pytest_asyncio.fixture()
+async def test_instance(db: AsyncSession, test_instance_id: int):
+    """Return the class's test Odoo instance, loaded into this test's session."""
+    from app.models.odoo_instance import OdooInstance
+
+    return await db.get(OdooInstance, test_instance_id)
 
 
 # ---------------------------------------------------------------------------
 # HTTPX AsyncClient (integration tests)
 # ---------------------------------------------------------------------------
 
+@pytest_asyncio.fixture(scope="session", autouse=True)
+async def warm_app() -> None:
+    """
+    Pay the app's one-off startup cost before the first test runs.
+
+    The first request builds the route tree, Pydantic validators and the
+    exception-handler path; mapper configuration is forced here too.  The
+    login body is deliberately invalid so it stops at validation and never
+    touches the database.
+    """
+    from sqlalchemy.orm import configure_mappers
+
+    from app.main import app
+
+    configure_mappers()
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        await ac.get("/health")
+        await ac.post("/api/v1/auth/login", json={"email": "warmup", "password": "warmup"})
+
+
 @pytest_asyncio.fixture()
-async def client(db: AsyncSession, test_user) -> AsyncGenerator[AsyncClient, None]:
+async def client(db: AsyncSession) -> AsyncGenerator[AsyncClient, None]:
     """
     An AsyncClient that talks to the real FastAPI app, but with the DB
     dependency overridden to use the test session.
@@ -151,7 +317,24 @@ async def client(db: AsyncSession, test_user) -> AsyncGenerator[AsyncClient, Non
 
 
 @pytest_asyncio.fixture()
-async def auth_client(client: AsyncClient, auth_token: str) -> AsyncClient:
-    """AsyncClient pre-configured with an auth header."""
+async def auth_client(client: AsyncClient, auth_token: str, test_user) -> AsyncClient:
+    """
+    AsyncClient pre-configured with an auth header.
+
+    ``get_current_user`` is overridden to hand back ``test_user`` directly, so
+    requests skip JWT decoding and the per-request user lookup.  Use
+    ``token_client`` when the real authentication path is under test.
+    """
+    from app.core.dependencies import get_current_user
+    from app.main import app
+
+    app.dependency_overrides[get_current_user] = lambda: test_user
+    client.headers["Authorization"] = f"Bearer {auth_token}"
+    return client
+
+
+@pytest_asyncio.fixture()
+async def token_client(client: AsyncClient, auth_token: str) -> AsyncClient:
+    """AsyncClient authenticated through the real JWT → user dependency."""
     client.headers["Authorization"] = f"Bearer {auth_token}"
     return client
@@ -0,0 +1,61 @@
+"""
+In-memory model builders for tests.
+
+Each ``build_*`` returns a transient ORM object with sensible defaults and
+never touches the database — add it to a session yourself when a test needs
+it persisted.  Keyword overrides replace any default.
+"""
+
+from app.models.domain import Domain
+from app.models.odoo_instance import OdooInstance
+from app.models.server import Server
+from app.models.user import User
+
+
+def build_user(**overrides) -> User:
+    fields = {
+        "email": "user@example.com",
+        "hashed_password": "not-a-real-hash",
+        "is_active": True,
+    }
+    fields.update(overrides)
+    return User(**fields)
+
+
+def build_server(owner_id: int = 1, **overrides) -> Server:
+    fields = {
+        "owner_id": owner_id,
+        "name": "Test Server",
+        "host": "192.168.1.100",
+        "port": 22,
+        "ssh_user": "root",
+        "ssh_key_encrypted": "not-a-real-token",
+    }
+    fields.update(overrides)
+    return Server(**fields)
+
+
+def build_instance(server_id: int = 1, **overrides) -> OdooInstance:
+    fields = {
+        "server_id": server_id,
+        "name": "Test Instance",
+        "odoo_version": "17.0",
+        "edition": "community",
+        "container_name": "odoo-test-s1",
+        "host_port": 8069,
+        "pg_container_name": "odoo-test-s1-db",
+        "pg_port": 9069,
+        "pg_password": "odoo",
+        "addons_path": "/opt/cloudtab/odoo-test-s1/addons",
+    }
+    fields.update(overrides)
+    return OdooInstance(**fields)
+
+
+def build_domain(instance_id: int = 1, **overrides) -> Domain:
+    fields = {
+        "instance_id": instance_id,
+        "domain_name": "odoo.example.com",
+    }
+    fields.update(overrides)
+    return Domain(**fields)
@@ -6,7 +6,8 @@ from httpx import AsyncClient
 
 class TestLogin:
     @pytest.mark.asyncio
-    async def test_login_success(self, client: AsyncClient, test_user):
+    @pytest.mark.usefixtures("test_user_id")
+    async def test_login_success(self, client: AsyncClient):
         resp = await client.post(
             "/api/v1/auth/login",
             json={"email": "test@cloudtab.local", "password": "testpass123"},
@@ -18,7 +19,8 @@ class TestLogin:
         assert data["token_type"] == "bearer"
 
     @pytest.mark.asyncio
-    async def test_login_wrong_password(self, client: AsyncClient, test_user):
+    @pytest.mark.usefixtures("test_user_id")
+    async def test_login_wrong_password(self, client: AsyncClient):
         resp = await client.post(
             "/api/v1/auth/login",
             json={"email": "test@cloudtab.local", "password": "wrongpass"},
@@ -44,7 +46,8 @@ class TestLogin:
 
 class TestRefresh:
     @pytest.mark.asyncio
-    async def test_refresh_success(self, client: AsyncClient, test_user):
+    @pytest.mark.usefixtures("test_user_id")
+    async def test_refresh_success(self, client: AsyncClient):
         # First login to get tokens
         login_resp = await client.post(
             "/api/v1/auth/login",
@@ -63,7 +66,8 @@ class TestRefresh:
         assert "refresh_token" in data
 
     @pytest.mark.asyncio
-    async def test_refresh_with_access_token_fails(self, client: AsyncClient, test_user):
+    @pytest.mark.usefixtures("test_user_id")
+    async def test_refresh_with_access_token_fails(self, client: AsyncClient):
         # Login to get an access token
         login_resp = await client.post(
             "/api/v1/auth/login",
@@ -89,8 +93,8 @@ class TestRefresh:
 
 class TestGetMe:
     @pytest.mark.asyncio
-    async def test_get_me_authenticated(self, auth_client: AsyncClient, test_user):
-        resp = await auth_client.get("/api/v1/users/me")
+    async def test_get_me_authenticated(self, token_client: AsyncClient, test_user):
+        resp = await token_client.get("/api/v1/users/me")
         assert resp.status_code == 200
         data = resp.json()
         assert data["email"] == "test@cloudtab.local"
@@ -9,6 +9,11 @@ from unittest.mock import MagicMock, patch
 import pytest
 from httpx import AsyncClient
 
+from app.schemas.domain import DomainCreate
+from app.schemas.git_repo import GitRepoCreate
+from app.services.domain_service import create_domain
+from app.services.git_service import create_git_repo
+
 
 # ═══════════════════════════════════════════════════════════════════════════
 # Instance endpoints
@@ -97,6 +102,12 @@ class TestInstances:
         assert resp.status_code == 200
         assert resp.json()["task_id"] == "stop-task-id"
 
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("tail", [0, 10001])
+    async def test_logs_tail_out_of_range(self, auth_client: AsyncClient, test_instance, tail):
+        resp = await auth_client.get(f"/api/v1/instances/{test_instance.id}/logs?tail={tail}")
+        assert resp.status_code == 422
+
 
 # ═══════════════════════════════════════════════════════════════════════════
 # Domain endpoints
@@ -125,29 +136,13 @@ class TestDomains:
         assert data["task_id"] == "nginx-task"
 
     @pytest.mark.asyncio
-    @patch("app.api.v1.domains.setup_nginx_proxy")
-    async def test_create_and_delete_domain(
-        self, mock_nginx, auth_client: AsyncClient, test_instance, db
-    ):
-        mock_task = MagicMock()
-        mock_task.id = "nginx-task-2"
-        mock_nginx.delay.return_value = mock_task
-
-        # Create
-        await auth_client.post(
-            f"/api/v1/instances/{test_instance.id}/domains",
-            json={"domain_name": "del.example.com"},
-        )
-
-        # List to get the domain ID
-        list_resp = await auth_client.get(
-            f"/api/v1/instances/{test_instance.id}/domains"
+    async def test_create_and_delete_domain(self, auth_client: AsyncClient, test_instance, db):
+        # Seed the domain directly; only the DELETE endpoint is under test
+        domain = await create_domain(
+            db, test_instance.id, DomainCreate(domain_name="del.example.com")
         )
-        domains = list_resp.json()
-        domain_id = next(d["id"] for d in domains if d["domain_name"] == "del.example.com")
 
-        # Delete
-        resp = await auth_client.delete(f"/api/v1/domains/{domain_id}")
+        resp = await auth_client.delete(f"/api/v1/domains/{domain.id}")
         assert resp.status_code == 204
 
 
@@ -262,14 +257,13 @@ class TestGitRepos:
         assert data["branch"] == "main"
 
     @pytest.mark.asyncio
-    async def test_link_and_get_git_repo(self, auth_client: AsyncClient, test_instance):
-        # Link
-        await auth_client.post(
-            f"/api/v1/instances/{test_instance.id}/git-repo",
-            json={"repo_url": "https://github.com/x/y.git", "branch": "dev"},
+    async def test_link_and_get_git_repo(self, auth_client: AsyncClient, test_instance, db):
+        await create_git_repo(
+            db,
+            test_instance.id,
+            GitRepoCreate(repo_url="https://github.com/x/y.git", branch="dev"),
         )
 
-        # Get
         resp = await auth_client.get(
             f"/api/v1/instances/{test_instance.id}/git-repo"
         )
@@ -279,20 +273,20 @@ class TestGitRepos:
 
     @pytest.mark.asyncio
     @patch("app.api.v1.git_repos.deploy_git_modules")
-    async def test_deploy_modules(self, mock_deploy, auth_client: AsyncClient, test_instance):
+    async def test_deploy_modules(
+        self, mock_deploy, auth_client: AsyncClient, test_instance, db
+    ):
         mock_task = MagicMock()
         mock_task.id = "deploy-modules-task"
         mock_deploy.delay.return_value = mock_task
 
-        # First link a repo
-        create_resp = await auth_client.post(
-            f"/api/v1/instances/{test_instance.id}/git-repo",
-            json={"repo_url": "https://github.com/a/b.git", "branch": "main"},
+        repo = await create_git_repo(
+            db,
+            test_instance.id,
+            GitRepoCreate(repo_url="https://github.com/a/b.git", branch="main"),
         )
-        repo_id = create_resp.json()["id"]
 
-        # Deploy
-        resp = await auth_client.post(f"/api/v1/git-repos/{repo_id}/deploy")
+        resp = await auth_client.post(f"/api/v1/git-repos/{repo.id}/deploy")
         assert resp.status_code == 200
         assert resp.json()["task_id"] == "deploy-modules-task"
 
@@ -4,22 +4,11 @@ import pytest
 from httpx import AsyncClient
 
 
-class TestListServers:
-    @pytest.mark.asyncio
-    async def test_list_servers_empty(self, auth_client: AsyncClient):
-        resp = await auth_client.get("/api/v1/servers")
-        assert resp.status_code == 200
-        assert isinstance(resp.json(), list)
-
-    @pytest.mark.asyncio
-    async def test_list_servers_unauthenticated(self, client: AsyncClient):
-        resp = await client.get("/api/v1/servers")
-        assert resp.status_code == 401
-
-
-class TestCreateServer:
+class TestServerLifecycle:
     @pytest.mark.asyncio
-    async def test_create_server_success(self, auth_client: AsyncClient):
+    async def test_server_full_lifecycle(self, auth_client: AsyncClient):
+        """Create → list → get → update → delete on a single fixture stack."""
+        # Create
         resp = await auth_client.post(
             "/api/v1/servers",
             json={
@@ -37,7 +26,43 @@ class TestCreateServer:
         assert data["status"] == "unknown"
         assert "ssh_key_encrypted" not in data  # Should not leak encrypted key
         assert "id" in data
+        server_id = data["id"]
+
+        # List
+        resp = await auth_client.get("/api/v1/servers")
+        assert resp.status_code == 200
+        assert server_id in [s["id"] for s in resp.json()]
+
+        # Get
+        resp = await auth_client.get(f"/api/v1/servers/{server_id}")
+        assert resp.status_code == 200
+        assert resp.json()["name"] == "API Test Server"
+
+        # Update
+        resp = await auth_client.patch(
+            f"/api/v1/servers/{server_id}",
+            json={"name": "Updated Name"},
+        )
+        assert resp.status_code == 200
+        assert resp.json()["name"] == "Updated Name"
+
+        # Delete
+        resp = await auth_client.delete(f"/api/v1/servers/{server_id}")
+        assert resp.status_code == 204
+
+        # Verify it's gone
+        resp = await auth_client.get(f"/api/v1/servers/{server_id}")
+        assert resp.status_code == 404
+
+
+class TestListServers:
+    @pytest.mark.asyncio
+    async def test_list_servers_unauthenticated(self, client: AsyncClient):
+        resp = await client.get("/api/v1/servers")
+        assert resp.status_code == 401
+
 
+class TestCreateServer:
     @pytest.mark.asyncio
     async def test_create_server_missing_fields(self, auth_client: AsyncClient):
         resp = await auth_client.post(
@@ -62,35 +87,7 @@ class TestCreateServer:
 
 
 class TestGetServer:
-    @pytest.mark.asyncio
-    async def test_get_server(self, auth_client: AsyncClient, test_server):
-        resp = await auth_client.get(f"/api/v1/servers/{test_server.id}")
-        assert resp.status_code == 200
-        assert resp.json()["name"] == "Test Server"
-
     @pytest.mark.asyncio
     async def test_get_server_not_found(self, auth_client: AsyncClient):
         resp = await auth_client.get("/api/v1/servers/99999")
         assert resp.status_code == 404
-
-
-class TestUpdateServer:
-    @pytest.mark.asyncio
-    async def test_update_server(self, auth_client: AsyncClient, test_server):
-        resp = await auth_client.patch(
-            f"/api/v1/servers/{test_server.id}",
-            json={"name": "Updated Name"},
-        )
-        assert resp.status_code == 200
-        assert resp.json()["name"] == "Updated Name"
-
-
-class TestDeleteServer:
-    @pytest.mark.asyncio
-    async def test_delete_server(self, auth_client: AsyncClient, test_server):
-        resp = await auth_client.delete(f"/api/v1/servers/{test_server.id}")
-        assert resp.status_code == 204
-
-        # Verify it's gone
-        resp2 = await auth_client.get(f"/api/v1/servers/{test_server.id}")
-        assert resp2.status_code == 404
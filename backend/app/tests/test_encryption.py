@@ -1,42 +1,65 @@
 """Unit tests for app.core.encryption — Fernet encrypt/decrypt."""
 
 import pytest
+from cryptography.fernet import InvalidToken
 
-from app.core.encryption import decrypt_value, encrypt_value
+from app.core.encryption import decrypt_value, decrypt_value_cached, encrypt_value
 
+UNICODE_TEXT = "key with unicode: cafe\u0301 \u2603"
 
-class TestEncryption:
-    def test_encrypt_returns_non_plaintext(self):
-        cipher = encrypt_value("my-secret-key")
-        assert cipher != "my-secret-key"
-        assert len(cipher) > 0
 
-    def test_decrypt_round_trip(self):
-        plaintext = "ssh-rsa AAAA... user@host"
-        cipher = encrypt_value(plaintext)
-        result = decrypt_value(cipher)
-        assert result == plaintext
+@pytest.fixture(scope="module")
+def sample_ciphers() -> dict[str, str]:
+    """Encrypt each round-trip sample once and share it across the module."""
+    return {
+        s: encrypt_value(s)
+        for s in ("hello", "", "ssh-rsa AAAA... user@host", UNICODE_TEXT)
+    }
 
-    def test_different_ciphertexts_for_same_input(self):
-        """Fernet uses a random IV, so two encryptions of the same input differ."""
-        c1 = encrypt_value("same-value")
-        c2 = encrypt_value("same-value")
-        assert c1 != c2
 
-    def test_decrypt_both_yield_same_plaintext(self):
-        c1 = encrypt_value("hello")
-        c2 = encrypt_value("hello")
-        assert decrypt_value(c1) == decrypt_value(c2) == "hello"
+def test_encrypt_returns_non_plaintext():
+    cipher = encrypt_value("my-secret-key")
+    assert cipher != "my-secret-key"
+    assert len(cipher) > 0
 
-    def test_empty_string(self):
-        cipher = encrypt_value("")
-        assert decrypt_value(cipher) == ""
 
-    def test_unicode_content(self):
-        text = "key with unicode: cafe\u0301 \u2603"
-        cipher = encrypt_value(text)
-        assert decrypt_value(cipher) == text
+def test_decrypt_round_trip(sample_ciphers):
+    plaintext = "ssh-rsa AAAA... user@host"
+    result = decrypt_value(sample_ciphers[plaintext])
+    assert result == plaintext
 
-    def test_decrypt_invalid_ciphertext_raises(self):
-        with pytest.raises(Exception):
-            decrypt_value("not-valid-fernet-token")
+
+def test_different_ciphertexts_for_same_input():
+    """Fernet uses a random IV, so two encryptions of the same input differ."""
+    c1 = encrypt_value("same-value")
+    c2 = encrypt_value("same-value")
+    assert c1 != c2
+
+
+def test_decrypt_both_yield_same_plaintext(sample_ciphers):
+    c1 = sample_ciphers["hello"]
+    c2 = encrypt_value("hello")
+    assert decrypt_value(c1) == decrypt_value(c2) == "hello"
+
+
+def test_empty_string(sample_ciphers):
+    assert decrypt_value(sample_ciphers[""]) == ""
+
+
+def test_unicode_content(sample_ciphers):
+    assert decrypt_value(sample_ciphers[UNICODE_TEXT]) == UNICODE_TEXT
+
+
+def test_decrypt_invalid_ciphertext_raises():
+    with pytest.raises(InvalidToken):
+        decrypt_value("not-valid-fernet-token")
+
+
+def test_decrypt_cached_matches_and_follows_rotation(sample_ciphers):
+    cipher = sample_ciphers["ssh-rsa AAAA... user@host"]
+    assert decrypt_value_cached(cipher) == "ssh-rsa AAAA... user@host"
+    assert decrypt_value_cached(cipher) == "ssh-rsa AAAA... user@host"
+    assert decrypt_value_cached.cache_info().hits >= 1
+
+    rotated = encrypt_value("ssh-ed25519 BBBB... user@host")
+    assert decrypt_value_cached(rotated) == "ssh-ed25519 BBBB... user@host"
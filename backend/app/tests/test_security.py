@@ -3,7 +3,7 @@
 from datetime import timedelta
 
 import pytest
-from jose import jwt
+from jose import ExpiredSignatureError, JWTError, jwt
 
 from app.core.config import settings
 from app.core.security import (
@@ -11,28 +11,38 @@ from app.core.security import (
     create_refresh_token,
     decode_token,
     hash_password,
+    hash_password_async,
     verify_password,
+    verify_password_async,
 )
 
 
-class TestPasswordHashing:
-    def test_hash_returns_bcrypt_string(self):
-        hashed = hash_password("mysecret")
-        assert hashed.startswith("$2b$")
-        assert hashed != "mysecret"
+def test_hash_returns_bcrypt_string():
+    hashed = hash_password("mysecret")
+    assert hashed.startswith("$2b$")
+    assert hashed != "mysecret"
 
-    def test_verify_correct_password(self):
-        hashed = hash_password("correct-horse")
-        assert verify_password("correct-horse", hashed) is True
 
-    def test_verify_wrong_password(self):
-        hashed = hash_password("correct-horse")
-        assert verify_password("wrong-horse", hashed) is False
+def test_verify_correct_password():
+    hashed = hash_password("correct-horse")
+    assert verify_password("correct-horse", hashed) is True
 
-    def test_different_hashes_for_same_password(self):
-        h1 = hash_password("same")
-        h2 = hash_password("same")
-        assert h1 != h2  # bcrypt uses random salt
+
+def test_verify_wrong_password():
+    hashed = hash_password("correct-horse")
+    assert verify_password("wrong-horse", hashed) is False
+
+
+def test_different_hashes_for_same_password():
+    h1 = hash_password("same")
+    h2 = hash_password("same")
+    assert h1 != h2  # bcrypt uses random salt
+
+
+async def test_async_hash_and_verify():
+    hashed = await hash_password_async("off-loop")
+    assert await verify_password_async("off-loop", hashed) is True
+    assert await verify_password_async("wrong", hashed) is False
 
 
 class TestAccessToken:
@@ -49,7 +59,7 @@ class TestAccessToken:
 
     def test_expired_token_raises(self):
         token = create_access_token("1", expires_delta=timedelta(seconds=-1))
-        with pytest.raises(Exception):  # jose.ExpiredSignatureError
+        with pytest.raises(ExpiredSignatureError):
             decode_token(token)
 
 
@@ -73,7 +83,7 @@ class TestRefreshToken:
 
 class TestDecodeToken:
     def test_invalid_token_raises(self):
-        with pytest.raises(Exception):
+        with pytest.raises(JWTError):
             decode_token("not-a-valid-token")
 
     def test_wrong_secret_raises(self):
@@ -82,5 +92,5 @@ class TestDecodeToken:
             "wrong-secret",
             algorithm=settings.ALGORITHM,
         )
-        with pytest.raises(Exception):
+        with pytest.raises(JWTError):
             decode_token(token)
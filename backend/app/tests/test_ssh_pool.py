@@ -0,0 +1,63 @@
+"""Unit tests for the per-process SSH connection pool."""
+
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import paramiko
+import pytest
+
+from app.services import ssh_pool
+
+SERVER = SimpleNamespace(host="10.0.0.1", port=22, ssh_user="root", ssh_key_encrypted="k")
+
+
+@pytest.fixture
+def fake_connect():
+    """Swap real SSH logins for mock connections and start from an empty pool."""
+    ssh_pool.close_all()
+    with patch.object(ssh_pool, "_connect", side_effect=lambda server: MagicMock()) as connect:
+        yield connect
+    ssh_pool.close_all()
+
+
+def test_connection_is_reused(fake_connect):
+    with ssh_pool.acquire(SERVER) as first:
+        pass
+    with ssh_pool.acquire(SERVER) as second:
+        pass
+
+    assert first is second
+    assert fake_connect.call_count == 1
+    first.close.assert_not_called()
+
+
+def test_idle_eviction_skips_connection_in_use(fake_connect):
+    with ssh_pool.acquire(SERVER) as held:
+        key = ssh_pool._pool_key(SERVER)
+        ssh_pool._last_used[key] -= ssh_pool.IDLE_TIMEOUT + 1
+        with ssh_pool._lock:
+            assert ssh_pool._evict_idle(ssh_pool.time.monotonic()) == []
+        held.close.assert_not_called()
+
+
+def test_broken_connection_closes_after_last_holder(fake_connect):
+    with ssh_pool.acquire(SERVER) as outer:
+        with pytest.raises(paramiko.SSHException), ssh_pool.acquire(SERVER) as inner:
+            assert inner is outer
+            raise paramiko.SSHException("channel closed")
+        # Dropped from the pool, but still open for the other holder
+        outer.close.assert_not_called()
+        with ssh_pool.acquire(SERVER) as fresh:
+            assert fresh is not outer
+    outer.close.assert_called_once()
+    fresh.close.assert_not_called()
+
+
+def test_unparseable_key_fails_without_connecting():
+    with (
+        patch.object(ssh_pool, "decrypt_value_cached", return_value="not a key"),
+        patch.object(ssh_pool.SSHService, "connect") as connect,
+        pytest.raises(ValueError, match="Unable to parse private key"),
+    ):
+        ssh_pool._connect(SERVER)
+    connect.assert_not_called()
@@ -0,0 +1,53 @@
+"""Unit tests for Celery worker task error handling."""
+
+from unittest.mock import MagicMock, patch
+
+import pytest
+from celery.exceptions import Retry
+
+from app.workers import odoo_tasks
+
+
+@pytest.fixture
+def logs_task():
+    """Run get_odoo_logs with the database and task log writes stubbed out."""
+    with (
+        patch.object(odoo_tasks, "get_sync_db", return_value=MagicMock()),
+        patch.object(odoo_tasks, "_load_instance", return_value=(MagicMock(), MagicMock())),
+        patch.object(odoo_tasks, "update_task_log") as update_log,
+        patch.object(odoo_tasks.get_odoo_logs, "retry", side_effect=Retry()) as retry,
+    ):
+        yield retry, update_log
+
+
+def test_retryable_ssh_error_triggers_retry(logs_task):
+    retry, update_log = logs_task
+    error = ConnectionResetError("connection reset by peer")
+    with patch.object(odoo_tasks.ssh_pool, "acquire", side_effect=error):
+        odoo_tasks.get_odoo_logs.apply(args=(1,))
+
+    retry.assert_called_once()
+    assert retry.call_args.kwargs["exc"] is error
+    # Nothing terminal is recorded while the retry is queued
+    update_log.assert_not_called()
+
+
+def test_last_retry_records_failure(logs_task):
+    retry, update_log = logs_task
+    error = ConnectionResetError("connection reset by peer")
+    with patch.object(odoo_tasks.ssh_pool, "acquire", side_effect=error):
+        result = odoo_tasks.get_odoo_logs.apply(args=(1,), retries=2).get()
+
+    retry.assert_not_called()
+    assert result == {"error": "connection reset by peer"}
+    assert update_log.call_args.args[1] == "failed"
+
+
+def test_non_retryable_error_is_returned(logs_task):
+    retry, update_log = logs_task
+    with patch.object(odoo_tasks.ssh_pool, "acquire", side_effect=RuntimeError("boom")):
+        result = odoo_tasks.get_odoo_logs.apply(args=(1,)).get()
+
+    retry.assert_not_called()
+    assert result == {"error": "boom"}
+    assert update_log.call_args.args[1] == "failed"
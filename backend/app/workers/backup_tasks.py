@@ -1,27 +1,45 @@
 import logging
 import os
+import shlex
 import tempfile
 from datetime import UTC, datetime, timedelta
 
+from celery import group
+from sqlalchemy import case, func, update
+
 from app.core.database_sync import get_sync_db
-from app.core.encryption import decrypt_value
 from app.models.backup_record import BackupRecord
 from app.models.backup_schedule import BackupSchedule
 from app.models.odoo_instance import OdooInstance
 from app.models.server import Server
+from app.services import ssh_pool
 from app.services.s3_service import (
+    bulk_delete_from_s3,
     delete_from_s3,
     download_file_from_s3,
+    get_s3_object_size,
     parse_s3_uri,
-    upload_file_to_s3,
+    upload_fileobj_to_s3,
 )
 from app.services.ssh_service import SSHService
 from app.workers.celery_app import celery_app
-from app.workers.utils import TaskLogger, update_task_log
+from app.workers.utils import InstancePaths, TaskLogger, update_task_log
 
 logger = logging.getLogger(__name__)
 
 
+# Per-process cache of which servers have pigz installed, keyed by server id
+_pigz_available: dict[int, bool] = {}
+
+
+def _tar_compress_flag(ssh: SSHService, server_id: int) -> str:
+    """Return the tar flag for gzip compression, preferring multi-core pigz."""
+    if server_id not in _pigz_available:
+        _, _, exit_code = ssh.execute("command -v pigz", timeout=5)
+        _pigz_available[server_id] = exit_code == 0
+    return "--use-compress-program=pigz" if _pigz_available[server_id] else "-z"
+
+
 def _get_schedule_storage_info(db, schedule_id: int | None) -> dict:
     """Look up the schedule to determine storage type and S3 settings.
 
@@ -43,40 +61,30 @@ def _get_schedule_storage_info(db, schedule_id: int | None) -> dict:
     }
 
 
-def _upload_backup_to_s3(
+def _stream_backup_to_s3(
     ssh: SSHService,
-    remote_file: str,
+    command: str,
     bucket: str,
     s3_key: str,
     tlog: TaskLogger | None = None,
 ) -> tuple[str, int | None]:
-    """Download backup from remote server via SSH, then upload to S3.
+    """Run a command that writes a backup to stdout and stream it into S3.
+
+    Nothing is staged on disk on either the server or the worker. If the
+    command fails after the upload has finished, the incomplete object is
+    removed from S3.
 
     Returns (s3_uri, file_size_bytes).
     """
-    with tempfile.NamedTemporaryFile(suffix=".tar.gz", delete=True) as tmp:
-        local_tmp = tmp.name
-
-    # SCP the backup file from remote server to local temp
     if tlog:
-        tlog.info("Downloading backup from server to worker: %s", remote_file)
-    ssh.download_file(remote_file, local_tmp)
-
+        tlog.info("Streaming backup to S3: s3://%s/%s", bucket, s3_key)
     try:
-        # Get file size
-        file_size = os.path.getsize(local_tmp)
-
-        # Upload to S3
-        if tlog:
-            tlog.info("Uploading to S3: s3://%s/%s (%d bytes)", bucket, s3_key, file_size)
-        s3_uri = upload_file_to_s3(local_tmp, bucket, s3_key)
-        return s3_uri, file_size
-    finally:
-        # Clean up local temp file
-        try:
-            os.remove(local_tmp)
-        except OSError:
-            pass
+        with ssh.stream_command(command, timeout=600) as stream:
+            s3_uri = upload_fileobj_to_s3(stream, bucket, s3_key)
+    except RuntimeError:
+        delete_from_s3(bucket, s3_key)
+        raise
+    return s3_uri, get_s3_object_size(bucket, s3_key)
 
 
 def _download_s3_to_remote(
@@ -88,10 +96,11 @@ def _download_s3_to_remote(
     """Download a backup from S3, then SCP it to the remote server."""
     bucket, s3_key = parse_s3_uri(s3_uri)
 
-    with tempfile.NamedTemporaryFile(suffix=".tar.gz", delete=True) as tmp:
-        local_tmp = tmp.name
+    # A private directory owns the temp file: nothing else can claim the name
+    # between creation and download, and cleanup is a single rmtree on exit
+    with tempfile.TemporaryDirectory(prefix="cloudtab-restore-") as tmp_dir:
+        local_tmp = os.path.join(tmp_dir, "backup.tar.gz")
 
-    try:
         # Download from S3 to local
         if tlog:
             tlog.info("Downloading from S3: %s", s3_uri)
@@ -100,14 +109,10 @@ def _download_s3_to_remote(
         # Upload to remote server via SCP
         if tlog:
             tlog.info("Uploading to remote server: %s", remote_path)
-        ssh.upload_file(local_tmp, remote_path)
-    finally:
-        try:
-            os.remove(local_tmp)
-        except OSError:
-            pass
+        ssh.bulk_upload(local_tmp, remote_path)
 
 
+# No autoretry: a retry would drop and restore the database all over again
 @celery_app.task(bind=True, name="backup.restore_backup")
 def restore_backup(self, record_id: int) -> dict:
     """Restore an Odoo instance from a backup record (pg_restore + filestore).
@@ -142,7 +147,7 @@ def restore_backup(self, record_id: int) -> dict:
             return result
 
         # Update tlog with instance context
-        tlog = TaskLogger(task_id, instance_id=instance.id, record_id=record_id)
+        tlog.bind(instance_id=instance.id)
 
         server = db.query(Server).filter(Server.id == instance.server_id).first()
         if not server:
@@ -151,22 +156,14 @@ def restore_backup(self, record_id: int) -> dict:
             update_task_log(task_id, "failed", result)
             return result
 
-        ssh = SSHService(
-            host=server.host,
-            port=server.port,
-            username=server.ssh_user,
-            private_key_pem=decrypt_value(server.ssh_key_encrypted),
-        )
-
         is_s3 = record.storage_type == "s3" and record.file_path.startswith("s3://")
 
         try:
-            with ssh:
+            with ssh_pool.acquire(server) as ssh:
                 odoo_name = instance.container_name
                 pg_name = instance.pg_container_name
-                data_dir = f"/opt/cloudtab/{odoo_name}/data"
+                data_dir = InstancePaths.for_container(odoo_name).data
                 restore_tmp = f"/tmp/{odoo_name}_restore"
-                sql_dump = f"{restore_tmp}/{odoo_name}_dump.sql"
 
                 # If S3 backup, download to server first
                 if is_s3:
@@ -175,76 +172,78 @@ def restore_backup(self, record_id: int) -> dict:
                     _download_s3_to_remote(ssh, record.file_path, backup_file, tlog)
                 else:
                     backup_file = record.file_path
-                    # Verify local backup file exists
-                    _, _, exit_code = ssh.execute(f"test -f {backup_file}", timeout=5)
-                    if exit_code != 0:
-                        raise RuntimeError(
-                            f"Backup file not found on server: {backup_file}"
-                        )
 
-                # Stop Odoo container to prevent writes during restore
+                # Stop Odoo container to prevent writes during restore. Local
+                # backups are checked for existence in the same exec, before
+                # the container is touched.
                 tlog.info("Stopping Odoo container %s for restore", odoo_name)
-                ssh.execute(f"docker stop {odoo_name}", timeout=60)
+                stop_cmd = f"docker stop {odoo_name}"
+                if not is_s3:
+                    stop_cmd = f"test -f {backup_file} || exit 3; {stop_cmd}"
+                _, _, exit_code = ssh.execute(stop_cmd, timeout=60)
+                if exit_code == 3:
+                    raise RuntimeError(f"Backup file not found on server: {backup_file}")
 
                 # Create temp extraction dir
                 ssh.execute(
                     f"rm -rf {restore_tmp} && mkdir -p {restore_tmp}", timeout=10
                 )
 
-                # Extract tarball
-                tlog.info("Extracting backup %s", backup_file)
+                # Unpack the whole archive in a single pass, so it is only
+                # decompressed once and no member is ever "not found".  The
+                # dump must be there before the database is dropped; the
+                # filestore is optional.
+                tlog.info("Extracting SQL dump and filestore from %s", backup_file)
+                dump_file = f"{odoo_name}_dump.sql"
                 stdout, stderr, exit_code = ssh.execute(
-                    f"tar -xzf {backup_file} -C {restore_tmp}",
-                    timeout=600,
+                    f"tar -x {_tar_compress_flag(ssh, server.id)} -f {backup_file} "
+                    f"-C {restore_tmp} || exit 1\n"
+                    f"test -s {restore_tmp}/{dump_file} || exit 4\n"
+                    f"test -d {restore_tmp}/filestore && echo filestore\n"
+                    "exit 0",
+                    timeout=900,
                 )
+                if exit_code == 4:
+                    raise RuntimeError(f"Backup has no SQL dump ({dump_file}); nothing restored")
                 if exit_code != 0:
                     raise RuntimeError(f"tar extract failed: {stderr}")
+                has_filestore = stdout.strip() == "filestore"
 
                 # Restore PostgreSQL database
                 tlog.info("Restoring database via %s", pg_name)
-                # Terminate active connections then drop+recreate
-                ssh.execute(
-                    f"docker exec {pg_name} psql -U odoo -d postgres -c "
-                    "\"SELECT pg_terminate_backend(pid) FROM pg_stat_activity "
-                    "WHERE datname = 'odoo' AND pid <> pg_backend_pid();\"",
-                    timeout=30,
-                )
-                ssh.execute(
-                    f"docker exec {pg_name} psql -U odoo -d postgres "
-                    "-c \"DROP DATABASE IF EXISTS odoo;\"",
-                    timeout=30,
-                )
-                ssh.execute(
-                    f"docker exec {pg_name} psql -U odoo -d postgres "
-                    "-c \"CREATE DATABASE odoo OWNER odoo;\"",
-                    timeout=30,
-                )
-
-                # Copy SQL dump into container and restore
-                ssh.execute(
-                    f"docker cp {sql_dump} {pg_name}:/tmp/restore.sql",
+                # Terminate active connections then drop+recreate, in one psql
+                # session (each statement still autocommits)
+                _, stderr, exit_code = ssh.execute(
+                    f"docker exec -i {pg_name} psql -U odoo -d postgres "
+                    "-v ON_ERROR_STOP=1 <<'SQL'\n"
+                    "SELECT pg_terminate_backend(pid) FROM pg_stat_activity "
+                    "WHERE datname = 'odoo' AND pid <> pg_backend_pid();\n"
+                    "DROP DATABASE IF EXISTS odoo;\n"
+                    "CREATE DATABASE odoo OWNER odoo;\n"
+                    "SQL",
                     timeout=60,
                 )
+                if exit_code != 0:
+                    raise RuntimeError(f"Database recreate failed: {stderr}")
+
+                # Feed the extracted dump to psql's stdin; it is never copied
+                # into the container
                 stdout, stderr, exit_code = ssh.execute(
-                    f"docker exec {pg_name} psql -U odoo -d odoo -f /tmp/restore.sql",
-                    timeout=600,
+                    f"docker exec -i {pg_name} psql -U odoo -d odoo "
+                    f"< {restore_tmp}/{dump_file}",
+                    timeout=900,
                 )
                 if exit_code != 0:
                     tlog.warning("psql restore warnings: %s", stderr)
 
-                ssh.execute(
-                    f"docker exec {pg_name} rm -f /tmp/restore.sql", timeout=5
-                )
-
                 # Restore filestore
                 tlog.info("Restoring filestore")
                 ssh.execute(f"rm -rf {data_dir}/filestore", timeout=30)
-                _, _, has_filestore = ssh.execute(
-                    f"test -d {restore_tmp}/filestore", timeout=5
-                )
-                if has_filestore == 0:
+                if has_filestore:
+                    # A rename when /tmp shares the filesystem; mv falls back
+                    # to copy + delete across devices on its own
                     ssh.execute(
-                        f"cp -a {restore_tmp}/filestore {data_dir}/filestore",
+                        f"mv {restore_tmp}/filestore {data_dir}/filestore",
                         timeout=120,
                     )
 
@@ -270,12 +269,7 @@ def restore_backup(self, record_id: int) -> dict:
         except Exception as e:
             # Try to restart the container even if restore fails
             try:
-                with SSHService(
-                    host=server.host,
-                    port=server.port,
-                    username=server.ssh_user,
-                    private_key_pem=decrypt_value(server.ssh_key_encrypted),
-                ) as recovery_ssh:
+                with ssh_pool.acquire(server) as recovery_ssh:
                     recovery_ssh.execute(
                         f"docker start {instance.container_name}", timeout=60
                     )
@@ -296,13 +290,14 @@ def restore_backup(self, record_id: int) -> dict:
         db.close()
 
 
+# No autoretry: every attempt would leave another BackupRecord behind
 @celery_app.task(bind=True, name="backup.run_backup")
 def run_backup(self, instance_id: int, schedule_id: int | None = None) -> dict:
     """Run a backup of an Odoo instance (pg_dump + filestore).
 
     Supports both local and S3 storage. When the schedule specifies S3 storage,
-    the backup is first created locally on the server, then uploaded to S3, and
-    the local copy is removed.
+    the tarball is streamed from the server straight into S3 without being
+    written to disk.
     """
     task_id = self.request.id
     tlog = TaskLogger(task_id, instance_id=instance_id)
@@ -347,19 +342,13 @@ def run_backup(self, instance_id: int, schedule_id: int | None = None) -> dict:
         db.commit()
         db.refresh(record)
 
-        ssh = SSHService(
-            host=server.host,
-            port=server.port,
-            username=server.ssh_user,
-            private_key_pem=decrypt_value(server.ssh_key_encrypted),
-        )
-
         try:
-            with ssh:
+            with ssh_pool.acquire(server) as ssh:
                 odoo_name = instance.container_name
                 pg_name = instance.pg_container_name
+                paths = InstancePaths.for_container(odoo_name)
                 timestamp = datetime.now(UTC).strftime("%Y%m%d_%H%M%S")
-                backup_dir = f"/opt/cloudtab/{odoo_name}/backups"
+                backup_dir = paths.backups
                 backup_filename = f"{odoo_name}_{timestamp}.tar.gz"
                 backup_file = f"{backup_dir}/{backup_filename}"
 
@@ -376,44 +365,45 @@ def run_backup(self, instance_id: int, schedule_id: int | None = None) -> dict:
                 if exit_code != 0:
                     raise RuntimeError(f"pg_dump failed: {stderr}")
 
-                # Create tarball with SQL dump + filestore
-                tlog.info("Creating tarball %s", backup_file)
-                data_dir = f"/opt/cloudtab/{odoo_name}/data"
-                stdout, stderr, exit_code = ssh.execute(
-                    f"tar -czf {backup_file} "
-                    f"-C /tmp {odoo_name}_dump.sql "
-                    f"-C {data_dir} .",
-                    timeout=600,
-                )
-                if exit_code != 0:
-                    raise RuntimeError(f"tar failed: {stderr}")
+                tar_sources = f"-C /tmp {odoo_name}_dump.sql -C {paths.data} ."
+                compress = _tar_compress_flag(ssh, server.id)
 
-                # Clean up temp SQL dump
-                ssh.execute(f"rm -f {sql_dump}", timeout=5)
-
-                # Get file size from remote server
-                size_out, _, _ = ssh.execute(
-                    f"stat -c%s {backup_file}", timeout=5
-                )
-                file_size = int(size_out) if size_out.strip().isdigit() else None
-
-                # Handle S3 upload if storage type is s3
-                final_path = backup_file
                 if storage_type == "s3" and s3_bucket:
                     # Build S3 key: prefix/container_name/filename
                     s3_key_parts = [s3_prefix.strip("/"), backup_filename]
                     s3_key = "/".join(p for p in s3_key_parts if p)
 
-                    s3_uri, s3_size = _upload_backup_to_s3(
-                        ssh, backup_file, s3_bucket, s3_key, tlog
+                    # Pipe the tarball straight into S3; no local copy is written
+                    try:
+                        final_path, file_size = _stream_backup_to_s3(
+                            ssh,
+                            f"tar -c {compress} -f - {tar_sources}",
+                            s3_bucket,
+                            s3_key,
+                            tlog,
+                        )
+                    finally:
+                        ssh.execute(f"rm -f {sql_dump}", timeout=5)
+                    tlog.info("S3 upload complete")
+                else:
+                    # Create tarball with SQL dump + filestore
+                    tlog.info("Creating tarball %s", backup_file)
+                    stdout, stderr, exit_code = ssh.execute(
+                        f"tar -c {compress} -f {backup_file} {tar_sources}",
+                        timeout=600,
                     )
-                    final_path = s3_uri
-                    if s3_size:
-                        file_size = s3_size
+                    if exit_code != 0:
+                        raise RuntimeError(f"tar failed: {stderr}")
 
-                    # Remove local backup after successful S3 upload
-                    ssh.execute(f"rm -f {backup_file}", timeout=10)
-                    tlog.info("S3 upload complete, local copy removed")
+                    # Clean up temp SQL dump
+                    ssh.execute(f"rm -f {sql_dump}", timeout=5)
+
+                    # Get file size from remote server
+                    size_out, _, _ = ssh.execute(
+                        f"stat -c%s {backup_file}", timeout=5
+                    )
+                    file_size = int(size_out) if size_out.strip().isdigit() else None
+                    final_path = backup_file
 
                 # Update record
                 record.status = "success"
@@ -470,8 +460,11 @@ def process_due_backups() -> dict:
     db = get_sync_db()
     try:
         now = datetime.now(UTC)
-        due_schedules = (
-            db.query(BackupSchedule)
+        # One query for schedules and their instances (outer join so missing
+        # instances can still be reported)
+        due_rows = (
+            db.query(BackupSchedule, OdooInstance)
+            .outerjoin(OdooInstance, OdooInstance.id == BackupSchedule.instance_id)
             .filter(
                 BackupSchedule.is_active.is_(True),
                 BackupSchedule.next_run_at <= now,
@@ -481,61 +474,73 @@ def process_due_backups() -> dict:
 
         triggered = []
         errors = []
+        next_runs: dict[int, datetime] = {}
+        eligible: list[tuple[BackupSchedule, OdooInstance]] = []
 
-        for schedule in due_schedules:
-            try:
-                # Verify the instance still exists
-                instance = (
-                    db.query(OdooInstance)
-                    .filter(OdooInstance.id == schedule.instance_id)
-                    .first()
+        for schedule, instance in due_rows:
+            if not instance:
+                logger.warning(
+                    "Schedule %d references missing instance %d, skipping",
+                    schedule.id,
+                    schedule.instance_id,
                 )
-                if not instance:
-                    logger.warning(
-                        "Schedule %d references missing instance %d, skipping",
-                        schedule.id,
-                        schedule.instance_id,
-                    )
-                    continue
-
-                if instance.status != "running":
-                    logger.info(
-                        "Instance %d (%s) not running, skipping scheduled backup",
-                        instance.id,
-                        instance.name,
-                    )
-                    continue
-
-                # Dispatch the backup task
-                task = run_backup.delay(schedule.instance_id, schedule.id)
-                triggered.append({
-                    "schedule_id": schedule.id,
-                    "instance_id": schedule.instance_id,
-                    "task_id": task.id,
-                })
-
-                # Advance next_run_at to prevent re-triggering
-                schedule.next_run_at = _calculate_next_run(schedule.frequency)
-                db.commit()
+                continue
 
+            if instance.status != "running":
                 logger.info(
-                    "Triggered scheduled backup for instance %s "
-                    "(schedule=%d, task=%s)",
+                    "Instance %d (%s) not running, skipping scheduled backup",
+                    instance.id,
                     instance.name,
-                    schedule.id,
-                    task.id,
                 )
+                continue
+
+            eligible.append((schedule, instance))
+
+        # Dispatch every backup through one group so they share a single
+        # broker connection and producer
+        if eligible:
+            try:
+                group_result = group(
+                    run_backup.s(schedule.instance_id, schedule.id)
+                    for schedule, _ in eligible
+                ).apply_async()
             except Exception as e:
-                logger.error(
-                    "Failed to trigger backup for schedule %d: %s",
-                    schedule.id,
-                    e,
+                logger.error("Failed to trigger scheduled backups: %s", e)
+                errors.extend(
+                    {"schedule_id": schedule.id, "error": str(e)}
+                    for schedule, _ in eligible
                 )
-                errors.append({"schedule_id": schedule.id, "error": str(e)})
+            else:
+                for (schedule, instance), task in zip(
+                    eligible, group_result.children, strict=True
+                ):
+                    triggered.append({
+                        "schedule_id": schedule.id,
+                        "instance_id": schedule.instance_id,
+                        "task_id": task.id,
+                    })
+                    next_runs[schedule.id] = _calculate_next_run(schedule.frequency)
+                    logger.info(
+                        "Triggered scheduled backup for instance %s "
+                        "(schedule=%d, task=%s)",
+                        instance.name,
+                        schedule.id,
+                        task.id,
+                    )
+
+        # Advance next_run_at for every dispatched schedule in one UPDATE
+        if next_runs:
+            db.execute(
+                update(BackupSchedule)
+                .where(BackupSchedule.id.in_(next_runs))
+                .values(next_run_at=case(next_runs, value=BackupSchedule.id))
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
 
         return {
             "checked_at": now.isoformat(),
-            "due_count": len(due_schedules),
+            "due_count": len(due_rows),
             "triggered": triggered,
             "errors": errors,
         }
@@ -558,133 +563,135 @@ def cleanup_expired_backups() -> dict:
         now = datetime.now(UTC)
         cleaned = []
         errors = []
-
-        # Find all schedules with retention policies
-        schedules = (
-            db.query(BackupSchedule)
-            .filter(BackupSchedule.retention_days > 0)
+        expired_s3: list[tuple[BackupRecord, BackupSchedule]] = []
+        expired_local: dict[
+            int, tuple[Server, list[tuple[BackupRecord, BackupSchedule]]]
+        ] = {}
+
+        # All expired records across every schedule with a retention policy,
+        # with the per-schedule cutoff computed in SQL
+        expired_rows = (
+            db.query(BackupRecord, BackupSchedule)
+            .join(BackupSchedule, BackupRecord.schedule_id == BackupSchedule.id)
+            .filter(
+                BackupSchedule.retention_days > 0,
+                BackupRecord.status == "success",
+                BackupRecord.file_path.isnot(None),
+                BackupRecord.created_at
+                < now - func.make_interval(0, 0, 0, BackupSchedule.retention_days),
+            )
             .all()
         )
 
-        for schedule in schedules:
-            cutoff = now - timedelta(days=schedule.retention_days)
-
-            expired_records = (
-                db.query(BackupRecord)
-                .filter(
-                    BackupRecord.schedule_id == schedule.id,
-                    BackupRecord.status == "success",
-                    BackupRecord.created_at < cutoff,
-                    BackupRecord.file_path.isnot(None),
-                )
+        local_rows = []
+        for record, schedule in expired_rows:
+            if record.storage_type == "s3" and record.file_path.startswith("s3://"):
+                expired_s3.append((record, schedule))
+            else:
+                local_rows.append((record, schedule))
+
+        # Local records need the server they live on: one lookup for all
+        if local_rows:
+            instance_ids = {schedule.instance_id for _, schedule in local_rows}
+            servers_by_instance = dict(
+                db.query(OdooInstance.id, Server)
+                .join(Server, Server.id == OdooInstance.server_id)
+                .filter(OdooInstance.id.in_(instance_ids))
                 .all()
             )
-
-            if not expired_records:
+            for record, schedule in local_rows:
+                server = servers_by_instance.get(schedule.instance_id)
+                if not server:
+                    continue
+                # Local files are removed in one command per server below
+                entry = expired_local.setdefault(server.id, (server, []))
+                entry[1].append((record, schedule))
+
+        # Clean up S3 records (no SSH needed), one DeleteObjects call per
+        # bucket and up to 1000 keys
+        by_bucket: dict[str, list[tuple[BackupRecord, BackupSchedule, str]]] = {}
+        for record, schedule in expired_s3:
+            try:
+                bucket, s3_key = parse_s3_uri(record.file_path)
+            except ValueError as e:
+                logger.error("Failed to clean S3 backup record %d: %s", record.id, e)
+                errors.append({"record_id": record.id, "error": str(e)})
                 continue
+            by_bucket.setdefault(bucket, []).append((record, schedule, s3_key))
+
+        cleaned_s3_ids = []
+        for bucket, entries in by_bucket.items():
+            deleted = bulk_delete_from_s3(bucket, [key for _, _, key in entries])
+            for record, schedule, s3_key in entries:
+                if s3_key not in deleted:
+                    errors.append({"record_id": record.id, "error": "S3 delete failed"})
+                    continue
+                cleaned_s3_ids.append(record.id)
+                cleaned.append({
+                    "record_id": record.id,
+                    "schedule_id": schedule.id,
+                    "storage": "s3",
+                })
+                logger.info(
+                    "Cleaned up expired S3 backup record %d "
+                    "(schedule=%d, retention=%dd)",
+                    record.id,
+                    schedule.id,
+                    schedule.retention_days,
+                )
 
-            # Separate S3 and local records
-            s3_records = [
-                r for r in expired_records
-                if r.storage_type == "s3" and r.file_path.startswith("s3://")
-            ]
-            local_records = [r for r in expired_records if r not in s3_records]
-
-            # Clean up S3 records (no SSH needed)
-            for record in s3_records:
-                try:
-                    bucket, s3_key = parse_s3_uri(record.file_path)
-                    if delete_from_s3(bucket, s3_key):
-                        record.file_path = None
-                        record.file_size_bytes = None
-                        db.commit()
-                        cleaned.append({
-                            "record_id": record.id,
-                            "schedule_id": schedule.id,
-                            "storage": "s3",
-                        })
-                        logger.info(
-                            "Cleaned up expired S3 backup record %d "
-                            "(schedule=%d, retention=%dd)",
-                            record.id,
-                            schedule.id,
-                            schedule.retention_days,
-                        )
-                    else:
-                        errors.append({
-                            "record_id": record.id,
-                            "error": "S3 delete failed",
-                        })
-                except Exception as e:
-                    logger.error(
-                        "Failed to clean S3 backup record %d: %s", record.id, e
-                    )
-                    errors.append({"record_id": record.id, "error": str(e)})
-
-            # Clean up local records (needs SSH)
-            if local_records:
-                instance = (
-                    db.query(OdooInstance)
-                    .filter(OdooInstance.id == schedule.instance_id)
-                    .first()
+        if cleaned_s3_ids:
+            db.execute(
+                update(BackupRecord)
+                .where(BackupRecord.id.in_(cleaned_s3_ids))
+                .values(file_path=None, file_size_bytes=None)
+            )
+            db.commit()
+
+        # Clean up local records: a single "rm -f" over SSH per server
+        for server, entries in expired_local.values():
+            try:
+                with ssh_pool.acquire(server) as ssh:
+                    paths = " ".join(shlex.quote(r.file_path) for r, _ in entries)
+                    _, stderr, exit_code = ssh.execute(f"rm -f {paths}", timeout=60)
+            except Exception as e:
+                logger.error(
+                    "SSH connection failed for cleanup on server %d: %s",
+                    server.id,
+                    e,
                 )
-                if not instance:
-                    continue
+                errors.append({"server_id": server.id, "error": str(e)})
+                continue
 
-                server = (
-                    db.query(Server)
-                    .filter(Server.id == instance.server_id)
-                    .first()
+            if exit_code != 0:
+                logger.error(
+                    "Failed to clean backups on server %d: %s", server.id, stderr
                 )
-                if not server:
-                    continue
+                errors.extend(
+                    {"record_id": record.id, "error": stderr or "rm failed"}
+                    for record, _ in entries
+                )
+                continue
 
-                try:
-                    ssh = SSHService(
-                        host=server.host,
-                        port=server.port,
-                        username=server.ssh_user,
-                        private_key_pem=decrypt_value(server.ssh_key_encrypted),
-                    )
-                    with ssh:
-                        for record in local_records:
-                            try:
-                                ssh.execute(
-                                    f"rm -f {record.file_path}", timeout=10
-                                )
-                                record.file_path = None
-                                record.file_size_bytes = None
-                                db.commit()
-                                cleaned.append({
-                                    "record_id": record.id,
-                                    "schedule_id": schedule.id,
-                                    "storage": "local",
-                                })
-                                logger.info(
-                                    "Cleaned up expired local backup record %d "
-                                    "(schedule=%d, retention=%dd)",
-                                    record.id,
-                                    schedule.id,
-                                    schedule.retention_days,
-                                )
-                            except Exception as e:
-                                logger.error(
-                                    "Failed to clean backup record %d: %s",
-                                    record.id,
-                                    e,
-                                )
-                                errors.append({
-                                    "record_id": record.id,
-                                    "error": str(e),
-                                })
-
-                except Exception as e:
-                    logger.error(
-                        "SSH connection failed for cleanup on server %d: %s",
-                        server.id,
-                        e,
-                    )
-                    errors.append({"server_id": server.id, "error": str(e)})
+            db.execute(
+                update(BackupRecord)
+                .where(BackupRecord.id.in_([record.id for record, _ in entries]))
+                .values(file_path=None, file_size_bytes=None)
+            )
+            db.commit()
+            for record, schedule in entries:
+                cleaned.append({
+                    "record_id": record.id,
+                    "schedule_id": schedule.id,
+                    "storage": "local",
+                })
+                logger.info(
+                    "Cleaned up expired local backup record %d "
+                    "(schedule=%d, retention=%dd)",
+                    record.id,
+                    schedule.id,
+                    schedule.retention_days,
+                )
 
         return {
             "cleaned_at": now.isoformat(),
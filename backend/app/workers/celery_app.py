@@ -1,7 +1,10 @@
 from celery import Celery
 from celery.schedules import crontab
+from celery.signals import worker_process_init, worker_process_shutdown, worker_shutdown
 
 from app.core.config import settings
+from app.core.database_sync import sync_engine
+from app.services import ssh_pool
 
 celery_app = Celery(
     "cloudtab",
@@ -18,6 +21,12 @@ celery_app.conf.update(
     task_track_started=True,
     task_acks_late=True,
     worker_prefetch_multiplier=1,
+    # Domain and git tasks are almost pure SSH/DB wait, so they go to a
+    # thread-pool worker (see the worker-io service) instead of prefork
+    task_routes={
+        "domain.*": {"queue": "ssh_io"},
+        "git.*": {"queue": "ssh_io"},
+    },
     # Retry policy for transient failures
     task_default_retry_delay=60,
     task_max_retries=3,
@@ -35,6 +44,19 @@ celery_app.conf.beat_schedule = {
     },
 }
 
+
+@worker_process_init.connect
+def _reset_db_pool(**kwargs) -> None:
+    # Forked children must not reuse connections inherited from the parent
+    sync_engine.dispose(close=False)
+
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def _close_ssh_pool(**kwargs) -> None:
+    ssh_pool.close_all()
+
+
 celery_app.autodiscover_tasks([
     "app.workers.server_tasks",
     "app.workers.odoo_tasks",
@@ -1,44 +1,124 @@
 import logging
+import re
+import shlex
 from datetime import UTC, datetime
+from string import Template
 
 from app.core.database_sync import get_sync_db
-from app.core.encryption import decrypt_value
 from app.models.domain import Domain
 from app.models.odoo_instance import OdooInstance
 from app.models.server import Server
-from app.services.ssh_service import SSHService
+from app.services import ssh_pool
 from app.workers.celery_app import celery_app
-from app.workers.utils import SSH_RETRYABLE, TaskLogger, update_task_log
+from app.workers.utils import (
+    SSH_PERMANENT,
+    SSH_RETRYABLE,
+    TaskLogger,
+    update_task_log,
+    will_retry,
+)
 
 logger = logging.getLogger(__name__)
 
 
+# Reverse-proxy site config; only the domain and upstream port vary.  Nginx's
+# own $variables are escaped as $$ for string.Template.
+_NGINX_TEMPLATE = Template("""server {
+    listen 80;
+    server_name $domain;
+
+    client_max_body_size 200M;
+    proxy_read_timeout 720s;
+    proxy_connect_timeout 720s;
+    proxy_send_timeout 720s;
+
+    location / {
+        proxy_pass http://127.0.0.1:$port;
+        proxy_set_header Host $$host;
+        proxy_set_header X-Real-IP $$remote_addr;
+        proxy_set_header X-Forwarded-For $$proxy_add_x_forwarded_for;
+        proxy_set_header X-Forwarded-Proto $$scheme;
+        proxy_redirect off;
+    }
+
+    location /longpolling {
+        proxy_pass http://127.0.0.1:$port;
+        proxy_set_header Host $$host;
+        proxy_set_header X-Real-IP $$remote_addr;
+        proxy_set_header X-Forwarded-For $$proxy_add_x_forwarded_for;
+        proxy_set_header X-Forwarded-Proto $$scheme;
+    }
+
+    location ~* /web/static/ {
+        proxy_pass http://127.0.0.1:$port;
+        proxy_cache_valid 200 90m;
+        proxy_buffering on;
+        expires 864000;
+    }
+}""")
+
+_CERTBOT_EXPIRY_RE = re.compile(r"expires? on (\d{4}-\d{2}-\d{2})")
+
+# openssl prints "notAfter=Mar  4 12:00:00 2026 GMT" with English month names
+# regardless of locale, so parse it by hand rather than with strptime's %b
+_OPENSSL_DATE_RE = re.compile(r"(\w{3})\s+(\d{1,2})\s+(\d{2}):(\d{2}):(\d{2})\s+(\d{4})")
+_MONTHS = {
+    name: number
+    for number, name in enumerate(
+        ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"),
+        start=1,
+    )
+}
+
+def _parse_cert_expiry(output: str) -> datetime | None:
+    """Extract the certificate expiry from the Certbot script output.
+
+    Prefers openssl's exact ``notAfter=`` line, falling back to the date
+    Certbot prints itself ("This certificate expires on YYYY-MM-DD").
+    """
+    for line in output.splitlines():
+        if line.startswith("notAfter="):
+            match = _OPENSSL_DATE_RE.search(line)
+            if match and match.group(1) in _MONTHS:
+                month, day, hour, minute, second, year = match.groups()
+                return datetime(
+                    int(year), _MONTHS[month], int(day),
+                    int(hour), int(minute), int(second), tzinfo=UTC,
+                )
+            break
+    match = _CERTBOT_EXPIRY_RE.search(output)
+    if match:
+        return datetime.fromisoformat(match.group(1)).replace(tzinfo=UTC)
+    return None
+
+
 def _load_domain_context(domain_id: int, db):
-    """Load domain, instance, and server records."""
-    domain = db.query(Domain).filter(Domain.id == domain_id).first()
-    if not domain:
+    """Load domain, instance, and server records in a single query."""
+    row = (
+        db.query(Domain, OdooInstance, Server)
+        .outerjoin(OdooInstance, OdooInstance.id == Domain.instance_id)
+        .outerjoin(Server, Server.id == OdooInstance.server_id)
+        .filter(Domain.id == domain_id)
+        .first()
+    )
+    if not row:
         raise ValueError("Domain not found")
-    instance = db.query(OdooInstance).filter(OdooInstance.id == domain.instance_id).first()
+    domain, instance, server = row
     if not instance:
         raise ValueError("Instance not found")
-    server = db.query(Server).filter(Server.id == instance.server_id).first()
     if not server:
         raise ValueError("Server not found")
-    ssh = SSHService(
-        host=server.host,
-        port=server.port,
-        username=server.ssh_user,
-        private_key_pem=decrypt_value(server.ssh_key_encrypted),
-    )
-    return ssh, domain, instance, server
+    return domain, instance, server
 
 
 @celery_app.task(
     bind=True,
     name="domain.setup_nginx",
     autoretry_for=SSH_RETRYABLE,
+    dont_autoretry_for=SSH_PERMANENT,
     retry_backoff=15,
     retry_backoff_max=120,
+    retry_jitter=True,
     retry_kwargs={"max_retries": 2},
 )
 def setup_nginx_proxy(self, domain_id: int) -> dict:
@@ -48,76 +128,60 @@ def setup_nginx_proxy(self, domain_id: int) -> dict:
     update_task_log(task_id, "running")
 
     db = get_sync_db()
+    domain = None
     try:
-        ssh, domain, instance, server = _load_domain_context(domain_id, db)
+        domain, instance, server = _load_domain_context(domain_id, db)
 
         tlog.info(
             "Setting up Nginx proxy for %s -> %s:%d",
             domain.domain_name, server.host, instance.host_port,
         )
 
-        with ssh:
+        with ssh_pool.acquire(server) as ssh:
             domain_name = domain.domain_name
             upstream_port = instance.host_port
 
-            # Ensure Nginx is installed
-            ssh.execute("which nginx > /dev/null 2>&1 || apt-get install -y nginx", timeout=120)
-
-            # Write Nginx config
-            nginx_config = f"""server {{
-    listen 80;
-    server_name {domain_name};
-
-    client_max_body_size 200M;
-    proxy_read_timeout 720s;
-    proxy_connect_timeout 720s;
-    proxy_send_timeout 720s;
-
-    location / {{
-        proxy_pass http://127.0.0.1:{upstream_port};
-        proxy_set_header Host $host;
-        proxy_set_header X-Real-IP $remote_addr;
-        proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
-        proxy_set_header X-Forwarded-Proto $scheme;
-        proxy_redirect off;
-    }}
-
-    location /longpolling {{
-        proxy_pass http://127.0.0.1:{upstream_port};
-        proxy_set_header Host $host;
-        proxy_set_header X-Real-IP $remote_addr;
-        proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
-        proxy_set_header X-Forwarded-Proto $scheme;
-    }}
-
-    location ~* /web/static/ {{
-        proxy_pass http://127.0.0.1:{upstream_port};
-        proxy_cache_valid 200 90m;
-        proxy_buffering on;
-        expires 864000;
-    }}
-}}"""
-            # Write config file using heredoc to avoid escaping issues
-            ssh.execute(
-                f"cat > /etc/nginx/sites-available/{domain_name}.conf << 'NGINX_EOF'\n{nginx_config}\nNGINX_EOF",
-                timeout=10,
-            )
-
-            # Enable site
-            ssh.execute(
-                f"ln -sf /etc/nginx/sites-available/{domain_name}.conf /etc/nginx/sites-enabled/{domain_name}.conf",
-                timeout=5,
+            nginx_config = _NGINX_TEMPLATE.substitute(domain=domain_name, port=upstream_port)
+
+            # Install (unless already known to be there), write the config
+            # from stdin, enable the site, then test and reload: all over one
+            # SSH channel
+            tlog.info("Writing and testing Nginx configuration")
+            # The domain name is user input, so every path built from it
+            # is shell-quoted
+            available = shlex.quote(f"/etc/nginx/sites-available/{domain_name}.conf")
+            available_new = shlex.quote(f"/etc/nginx/sites-available/{domain_name}.conf.new")
+            enabled = shlex.quote(f"/etc/nginx/sites-enabled/{domain_name}.conf")
+            script = [] if server.has_nginx else [
+                "which nginx > /dev/null 2>&1 || apt-get install -y nginx < /dev/null",
+            ]
+            script.append(f"cat > {available_new}")
+            if domain.status == "active":
+                # The last run went live with whatever is on disk, so an
+                # identical config needs neither `nginx -t` nor a reload
+                script += [
+                    f"if cmp -s {available_new} {available} && [ -L {enabled} ]; then",
+                    f"  rm -f {available_new}",
+                    "  echo unchanged",
+                    "  exit 0",
+                    "fi",
+                ]
+            script += [
+                f"mv {available_new} {available}",
+                f"ln -sf {available} {enabled}",
+                "nginx -t",
+                "systemctl reload nginx",
+            ]
+            stdout, stderr, exit_code = ssh.execute_script(
+                "\n".join(script), stdin=nginx_config + "\n", timeout=150
             )
-
-            # Test and reload Nginx
-            tlog.info("Testing Nginx configuration")
-            stdout, stderr, exit_code = ssh.execute("nginx -t", timeout=10)
             if exit_code != 0:
-                raise RuntimeError(f"Nginx config test failed: {stderr}")
-
-            ssh.execute("systemctl reload nginx", timeout=10)
+                raise RuntimeError(f"Nginx setup failed: {stderr}")
+            if stdout.strip() == "unchanged":
+                tlog.info("Nginx config for %s unchanged; reload skipped", domain_name)
 
             domain.status = "active"
+            server.has_nginx = True
             db.commit()
 
             result = {"status": "active", "domain": domain_name}
@@ -126,13 +190,17 @@ def setup_nginx_proxy(self, domain_id: int) -> dict:
             return result
 
     except Exception as e:
-        try:
-            domain_obj = db.query(Domain).filter(Domain.id == domain_id).first()
-            if domain_obj:
-                domain_obj.status = "failed"
+        if will_retry(self, e):
+            tlog.warning("Nginx setup failed, retrying: %s", e)
+            raise
+        if domain is not None:
+            try:
+                # The session may hold the failed transaction; start clean
+                db.rollback()
+                domain.status = "failed"
                 db.commit()
-        except Exception:
-            pass
+            except Exception:
+                logger.exception("Could not mark domain %d failed", domain_id)
         result = {"error": str(e)}
         tlog.error("Nginx setup failed: %s", e)
         update_task_log(task_id, "failed", result)
@@ -145,9 +213,11 @@ def setup_nginx_proxy(self, domain_id: int) -> dict:
     bind=True,
     name="domain.issue_ssl",
     autoretry_for=SSH_RETRYABLE,
+    dont_autoretry_for=SSH_PERMANENT,
     retry_backoff=30,
-    retry_backoff_max=300,
-    retry_kwargs={"max_retries": 3},
+    retry_backoff_max=60,
+    retry_jitter=True,
+    retry_kwargs={"max_retries": 2},
 )
 def issue_ssl_cert(self, domain_id: int) -> dict:
     """Issue a Let's Encrypt SSL certificate for a domain via Certbot."""
@@ -155,61 +225,61 @@ def issue_ssl_cert(self, domain_id: int) -> dict:
     tlog = TaskLogger(task_id, domain_id=domain_id)
     update_task_log(task_id, "running")
 
+    # ssl_status was already set to "pending" by the API request that queued
+    # this task, so only the outcome is written here
     db = get_sync_db()
+    domain = None
     try:
-        ssh, domain, instance, server = _load_domain_context(domain_id, db)
-
-        domain.ssl_status = "pending"
-        db.commit()
+        domain, instance, server = _load_domain_context(domain_id, db)
 
         tlog.info("Issuing SSL certificate for %s", domain.domain_name)
 
-        with ssh:
+        with ssh_pool.acquire(server) as ssh:
             domain_name = domain.domain_name
 
-            # Ensure Certbot is installed
-            ssh.execute(
-                "which certbot > /dev/null 2>&1 || apt-get install -y certbot python3-certbot-nginx",
-                timeout=120,
-            )
-
-            # Issue certificate
+            # Install Certbot unless already known to be there, issue the
+            # certificate and print its notAfter date, all over one SSH channel
             tlog.info("Running Certbot for %s", domain_name)
-            stdout, stderr, exit_code = ssh.execute(
-                f"certbot --nginx -d {domain_name} --non-interactive --agree-tos --register-unsafely-without-email",
-                timeout=120,
+            install = "" if server.has_certbot else (
+                "which certbot > /dev/null 2>&1 "
+                "|| apt-get install -y certbot python3-certbot-nginx < /dev/null >&2\n"
+            )
+            stdout, stderr, exit_code = ssh.execute_script(
+                install
+                + f"certbot --nginx -d {shlex.quote(domain_name)} --non-interactive --agree-tos "
+                "--register-unsafely-without-email\n"
+                f"openssl x509 -enddate -noout "
+                f"-in {shlex.quote(f'/etc/letsencrypt/live/{domain_name}/cert.pem')} "
+                "2>/dev/null || true\n",
+                timeout=240,
             )
 
             if exit_code != 0:
-                domain.ssl_status = "failed"
-                db.commit()
-                result = {"error": f"Certbot failed: {stderr}"}
-                tlog.error("Certbot failed for %s: %s", domain_name, stderr)
-                update_task_log(task_id, "failed", result)
-                return result
-
-            # Get certificate expiry date
-            expiry_out, _, _ = ssh.execute(
-                f"openssl x509 -enddate -noout -in /etc/letsencrypt/live/{domain_name}/cert.pem 2>/dev/null | cut -d= -f2",
-                timeout=10,
-            )
+                raise RuntimeError(f"Certbot failed: {stderr}")
 
             domain.ssl_status = "active"
-            if expiry_out:
-                try:
-                    domain.ssl_expires_at = datetime.strptime(
-                        expiry_out.strip(), "%b %d %H:%M:%S %Y %Z"
-                    ).replace(tzinfo=UTC)
-                except ValueError:
-                    pass
+            server.has_certbot = True
+            domain.ssl_expires_at = _parse_cert_expiry(stdout) or domain.ssl_expires_at
             db.commit()
 
             result = {"status": "active", "ssl_expires_at": str(domain.ssl_expires_at)}
-            tlog.info("SSL certificate issued for %s (expires %s)", domain_name, domain.ssl_expires_at)
+            tlog.info(
+                "SSL certificate issued for %s (expires %s)", domain_name, domain.ssl_expires_at
+            )
             update_task_log(task_id, "success", result)
             return result
 
     except Exception as e:
+        if will_retry(self, e):
+            tlog.warning("SSL issuance failed, retrying: %s", e)
+            raise
+        if domain is not None:
+            try:
+                db.rollback()
+                domain.ssl_status = "failed"
+                db.commit()
+            except Exception:
+                logger.exception("Could not mark SSL status of domain %d failed", domain_id)
         result = {"error": str(e)}
         tlog.error("SSL issuance failed: %s", e)
         update_task_log(task_id, "failed", result)
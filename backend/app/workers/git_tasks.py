@@ -1,14 +1,22 @@
 import logging
+import shlex
 from datetime import UTC, datetime
 
 from app.core.database_sync import get_sync_db
-from app.core.encryption import decrypt_value
+from app.core.encryption import decrypt_value_cached
 from app.models.git_repo import GitRepo
 from app.models.odoo_instance import OdooInstance
 from app.models.server import Server
-from app.services.ssh_service import SSHService
+from app.services import ssh_pool
 from app.workers.celery_app import celery_app
-from app.workers.utils import SSH_RETRYABLE, TaskLogger, update_task_log
+from app.workers.utils import (
+    SSH_PERMANENT,
+    SSH_RETRYABLE,
+    InstancePaths,
+    TaskLogger,
+    update_task_log,
+    will_retry,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -17,9 +25,11 @@ logger = logging.getLogger(__name__)
     bind=True,
     name="git.deploy_modules",
     autoretry_for=SSH_RETRYABLE,
+    dont_autoretry_for=SSH_PERMANENT,
     retry_backoff=30,
-    retry_backoff_max=300,
-    retry_kwargs={"max_retries": 3},
+    retry_backoff_max=60,
+    retry_jitter=True,
+    retry_kwargs={"max_retries": 2},
 )
 def deploy_git_modules(self, repo_id: int) -> dict:
     """Pull a git repo and deploy Odoo addons to the instance."""
@@ -29,14 +39,20 @@ def deploy_git_modules(self, repo_id: int) -> dict:
 
     db = get_sync_db()
     try:
-        repo = db.query(GitRepo).filter(GitRepo.id == repo_id).first()
-        if not repo:
+        row = (
+            db.query(GitRepo, OdooInstance, Server)
+            .outerjoin(OdooInstance, OdooInstance.id == GitRepo.instance_id)
+            .outerjoin(Server, Server.id == OdooInstance.server_id)
+            .filter(GitRepo.id == repo_id)
+            .first()
+        )
+        if not row:
             result = {"error": "Git repo not found"}
             tlog.error("Git repo %d not found", repo_id)
             update_task_log(task_id, "failed", result)
             return result
 
-        instance = db.query(OdooInstance).filter(OdooInstance.id == repo.instance_id).first()
+        repo, instance, server = row
         if not instance:
             result = {"error": "Instance not found"}
             tlog.error("Instance not found for repo %d", repo_id)
@@ -44,102 +60,106 @@ def deploy_git_modules(self, repo_id: int) -> dict:
             return result
 
         # Enrich tlog with instance context
-        tlog = TaskLogger(task_id, repo_id=repo_id, instance_id=instance.id)
+        tlog.bind(instance_id=instance.id)
 
-        server = db.query(Server).filter(Server.id == instance.server_id).first()
         if not server:
             result = {"error": "Server not found"}
             tlog.error("Server not found for instance %d", instance.id)
             update_task_log(task_id, "failed", result)
             return result
 
-        ssh = SSHService(
-            host=server.host,
-            port=server.port,
-            username=server.ssh_user,
-            private_key_pem=decrypt_value(server.ssh_key_encrypted),
-        )
-
         tlog.info(
             "Deploying git modules from %s (branch %s) to %s",
             repo.repo_url, repo.branch, instance.container_name,
         )
 
-        with ssh:
+        with ssh_pool.acquire(server) as ssh:
             odoo_name = instance.container_name
-            addons_dir = f"/opt/cloudtab/{odoo_name}/addons"
-            repo_dir = f"/opt/cloudtab/{odoo_name}/repo"
-
-            # Install git if not present
-            ssh.execute("which git > /dev/null 2>&1 || apt-get install -y git", timeout=60)
-
-            # If deploy key exists, set up SSH key for git
-            if repo.deploy_key_encrypted:
-                deploy_key = decrypt_value(repo.deploy_key_encrypted)
-                ssh.execute(f"mkdir -p /root/.ssh && chmod 700 /root/.ssh", timeout=5)
-                # Write deploy key using heredoc
-                ssh.execute(
-                    f"cat > /root/.ssh/cloudtab_deploy_key << 'KEY_EOF'\n{deploy_key}\nKEY_EOF",
-                    timeout=5,
-                )
-                ssh.execute("chmod 600 /root/.ssh/cloudtab_deploy_key", timeout=5)
-                git_ssh_cmd = "GIT_SSH_COMMAND='ssh -i /root/.ssh/cloudtab_deploy_key -o StrictHostKeyChecking=no'"
-            else:
-                git_ssh_cmd = "GIT_SSH_COMMAND='ssh -o StrictHostKeyChecking=no'"
-
-            # Clone or pull the repository
-            _, _, exit_code = ssh.execute(f"test -d {repo_dir}/.git", timeout=5)
-            if exit_code == 0:
-                # Repo already cloned — pull latest
-                tlog.info("Pulling latest changes from origin/%s", repo.branch)
-                stdout, stderr, exit_code = ssh.execute(
-                    f"cd {repo_dir} && {git_ssh_cmd} git fetch origin && git checkout {repo.branch} && {git_ssh_cmd} git pull origin {repo.branch}",
-                    timeout=120,
+            paths = InstancePaths.for_container(odoo_name)
+
+            # Install git, write the deploy key, clone or pull, sync every
+            # module (dir with __manifest__.py) into addons and restart Odoo,
+            # all in one script over a single SSH channel. The script prints
+            # the commit SHA followed by one deployed module name per line.
+            script = []
+            if not server.has_git:
+                script.append(
+                    "(which git && which rsync) > /dev/null 2>&1 "
+                    "|| apt-get install -y git rsync < /dev/null >&2"
                 )
+            stdin = ""
+            if repo.deploy_key_encrypted:
+                # The key arrives on stdin, so it never appears in the command
+                stdin = decrypt_value_cached(repo.deploy_key_encrypted).rstrip("\n") + "\n"
+                script += [
+                    "mkdir -p /root/.ssh && chmod 700 /root/.ssh",
+                    "(umask 077 && cat > /root/.ssh/cloudtab_deploy_key)",
+                    "export GIT_SSH_COMMAND='ssh -i /root/.ssh/cloudtab_deploy_key "
+                    "-o StrictHostKeyChecking=no'",
+                ]
             else:
-                # Fresh clone
-                tlog.info("Cloning repository: %s", repo.repo_url)
-                ssh.execute(f"mkdir -p {repo_dir}", timeout=5)
-                stdout, stderr, exit_code = ssh.execute(
-                    f"{git_ssh_cmd} git clone -b {repo.branch} {repo.repo_url} {repo_dir}",
-                    timeout=180,
-                )
+                script.append("export GIT_SSH_COMMAND='ssh -o StrictHostKeyChecking=no'")
+
+            # Git output goes to stderr; exit code 10 marks a git failure.
+            # The URL and branch are user input: shell-quote them, and keep
+            # them from being read as git options
+            repo_url = shlex.quote(repo.repo_url)
+            branch = shlex.quote(repo.branch)
+            branch_ref = shlex.quote(f"refs/heads/{repo.branch}")
+            script += [
+                # Only the branch tip is needed, so fetch and clone shallow
+                f"if [ -d {paths.repo}/.git ]; then",
+                f"  (git -C {paths.repo} fetch --depth=1 origin {branch_ref} "
+                f"&& git -C {paths.repo} reset --hard FETCH_HEAD) >&2 || exit 10",
+                "else",
+                f"  (mkdir -p {paths.repo} && git clone --depth=1 --single-branch "
+                f"-b {branch} -- {repo_url} {paths.repo}) >&2 || exit 10",
+                "fi",
+                f"head=$(git -C {paths.repo} rev-parse HEAD)",
+                'echo "$head"',
+                f"mkdir -p {paths.addons}",
+                # The module list only changes with the commit, so reuse the
+                # one saved by the last deploy instead of walking the repo again
+                f"modules_cache={paths.repo}/.cloudtab_modules",
+                f'if [ "$head" != "{repo.last_commit_sha or ""}" ] '
+                '|| [ ! -f "$modules_cache" ]; then',
+                f"  find {paths.repo} -name '__manifest__.py' -exec dirname {{}} \\; "
+                '> "$modules_cache.tmp"',
+                '  mv "$modules_cache.tmp" "$modules_cache"',
+                "fi",
+                # rsync only rewrites changed files and drops deleted ones;
+                # four run at once since each is mostly waiting on disk
+                """sync='rsync -a --delete --exclude=.git "$1/" "$0/$(basename "$1")/"'""",
+                f"xargs -d '\\n' -r -P4 -I{{}} sh -c \"$sync\" {paths.addons} {{}} "
+                '< "$modules_cache"',
+                'sed "s#.*/##" "$modules_cache"',
+                f"docker restart {odoo_name} > /dev/null",
+            ]
 
-            if exit_code != 0:
+            tlog.info(
+                "Syncing %s (branch %s) and restarting %s",
+                repo.repo_url, repo.branch, odoo_name,
+            )
+            stdout, stderr, exit_code = ssh.execute_script(
+                "\n".join(script), stdin=stdin, timeout=420
+            )
+
+            if exit_code == 10:
                 result = {"error": f"Git operation failed: {stderr}"}
                 tlog.error("Git operation failed: %s", stderr)
                 update_task_log(task_id, "failed", result)
                 return result
+            if exit_code != 0:
+                raise RuntimeError(f"Deploy script failed: {stderr}")
 
-            # Get latest commit SHA
-            commit_sha, _, _ = ssh.execute(f"cd {repo_dir} && git rev-parse HEAD", timeout=5)
-
-            # Copy addons to the instance addons directory
-            # Find directories that contain __manifest__.py (Odoo modules)
-            ssh.execute(f"mkdir -p {addons_dir}", timeout=5)
-            module_dirs, _, _ = ssh.execute(
-                f"find {repo_dir} -name '__manifest__.py' -exec dirname {{}} \\;",
-                timeout=30,
-            )
-
-            if module_dirs:
-                for module_dir in module_dirs.strip().split("\n"):
-                    module_name = module_dir.rstrip("/").split("/")[-1]
-                    ssh.execute(
-                        f"rm -rf {addons_dir}/{module_name} && cp -r {module_dir} {addons_dir}/{module_name}",
-                        timeout=30,
-                    )
-
-            # Restart Odoo to pick up new modules
-            tlog.info("Restarting Odoo container %s to load new modules", odoo_name)
-            ssh.execute(f"docker restart {odoo_name}", timeout=60)
+            commit_sha, *deployed_modules = stdout.split("\n")
 
             # Update repo record
             repo.last_deployed_at = datetime.now(UTC)
             repo.last_commit_sha = commit_sha.strip()[:40] if commit_sha else None
+            server.has_git = True
             db.commit()
 
-            deployed_modules = [d.rstrip("/").split("/")[-1] for d in module_dirs.strip().split("\n")] if module_dirs else []
             result = {
                 "status": "deployed",
                 "commit": repo.last_commit_sha,
@@ -153,6 +173,9 @@ def deploy_git_modules(self, repo_id: int) -> dict:
             return result
 
     except Exception as e:
+        if will_retry(self, e):
+            tlog.warning("Git deploy failed, retrying: %s", e)
+            raise
         result = {"error": str(e)}
         tlog.error("Git deploy failed: %s", e)
         update_task_log(task_id, "failed", result)
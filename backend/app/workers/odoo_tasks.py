@@ -1,43 +1,103 @@
 import json
 import logging
+import shlex
 from datetime import UTC, datetime
+from string import Template
+
+from sqlalchemy.orm import load_only
 
 from app.core.database_sync import get_sync_db
-from app.core.encryption import decrypt_value
 from app.models.odoo_instance import OdooInstance
 from app.models.server import Server
-from app.services.ssh_service import SSHService
+from app.services import ssh_pool
 from app.workers.celery_app import celery_app
-from app.workers.utils import SSH_RETRYABLE, TaskLogger, update_task_log
+from app.workers.utils import (
+    SSH_PERMANENT,
+    SSH_RETRYABLE,
+    InstancePaths,
+    TaskLogger,
+    update_task_log,
+    will_retry,
+)
 
 logger = logging.getLogger(__name__)
 
+# Upper bounds on the log output returned by get_odoo_logs
+_LOGS_MAX_BYTES = 512 * 1024
+_LOGS_MAX_LINES = 10000
+
+_PG_IMAGE = "postgres:16-alpine"
+
+# `docker run` commands for an instance's two containers; only names, ports
+# and paths vary.  Values are substituted as-is, so quote any free text.
+_PG_RUN_TEMPLATE = Template(
+    "docker run -d --name $pg --network $network --restart unless-stopped"
+    " -e POSTGRES_USER=odoo -e POSTGRES_PASSWORD=$password -e POSTGRES_DB=postgres"
+    " --health-cmd='pg_isready -U odoo'"
+    " --health-interval=1s --health-retries=30 --health-start-period=2s"
+    " -v $pgdata:/var/lib/postgresql/data"
+    f" {_PG_IMAGE}"
+)
+_ODOO_RUN_TEMPLATE = Template(
+    "docker run -d --name $odoo --network $network --restart unless-stopped"
+    " -p $port:8069"
+    " -v $data:/var/lib/odoo"
+    " -v $addons:/mnt/extra-addons"
+    " -v $conf:/etc/odoo/odoo.conf"
+    " $image"
+)
+
+
+def _wait_for_postgres(pg_name: str, seconds: int) -> str:
+    """Shell snippet that waits up to ``seconds`` for a PG container to be ready.
+
+    Containers deployed with a health check are polled via ``docker inspect``
+    (the daemon runs the probe); older ones run a single ``pg_isready`` loop
+    inside the container rather than one ``docker exec`` per attempt.
+    """
+    health = f"docker inspect -f '{{{{if .State.Health}}}}{{{{.State.Health.Status}}}}{{{{end}}}}' {pg_name}"
+    return (
+        f'if [ -n "$({health} 2>/dev/null || true)" ]; then\n'
+        f"  for i in $(seq 1 {seconds * 2}); do\n"
+        f'    [ "$({health} 2>/dev/null || true)" = healthy ] && break\n'
+        "    sleep 0.5\n"
+        "  done\n"
+        "else\n"
+        f"  docker exec {pg_name} sh -c 'for i in $(seq 1 {seconds}); do"
+        " pg_isready -U odoo -q && exit 0; sleep 1; done' || true\n"
+        "fi\n"
+    )
+
+
+def _load_instance(
+    instance_id: int, db, lean: bool = False
+) -> tuple[OdooInstance, Server]:
+    """Load an instance and its server in a single query, or raise.
 
-def _get_ssh_for_instance(instance_id: int, db):
-    """Load instance + server, return (ssh_service, instance, server) or raise."""
-    instance = db.query(OdooInstance).filter(OdooInstance.id == instance_id).first()
-    if not instance:
+    With ``lean``, only the container names and SSH connection details are
+    fetched; enough for the container lifecycle and log tasks.
+    """
+    query = (
+        db.query(OdooInstance, Server)
+        .outerjoin(Server, Server.id == OdooInstance.server_id)
+        .filter(OdooInstance.id == instance_id)
+    )
+    if lean:
+        query = query.options(
+            load_only(OdooInstance.container_name, OdooInstance.pg_container_name),
+            load_only(Server.host, Server.port, Server.ssh_user, Server.ssh_key_encrypted),
+        )
+    row = query.first()
+    if not row:
         raise ValueError("Instance not found")
-    server = db.query(Server).filter(Server.id == instance.server_id).first()
+    instance, server = row
     if not server:
         raise ValueError("Server not found")
-    ssh = SSHService(
-        host=server.host,
-        port=server.port,
-        username=server.ssh_user,
-        private_key_pem=decrypt_value(server.ssh_key_encrypted),
-    )
-    return ssh, instance, server
+    return instance, server
 
 
-@celery_app.task(
-    bind=True,
-    name="odoo.deploy",
-    autoretry_for=SSH_RETRYABLE,
-    retry_backoff=30,
-    retry_backoff_max=300,
-    retry_kwargs={"max_retries": 3},
-)
+# No autoretry: a half-finished deploy is not safe to re-run from the top
+@celery_app.task(bind=True, name="odoo.deploy")
 def deploy_odoo_instance(self, instance_id: int) -> dict:
     """Deploy an Odoo instance (Postgres + Odoo containers) on the target server."""
     task_id = self.request.id
@@ -46,13 +106,12 @@ def deploy_odoo_instance(self, instance_id: int) -> dict:
 
     db = get_sync_db()
     try:
-        ssh, instance, server = _get_ssh_for_instance(instance_id, db)
-
-        instance.status = "deploying"
-        db.commit()
+        # status was already set to "deploying" by the API request that
+        # queued this task, so only the outcome is written here
+        instance, server = _load_instance(instance_id, db)
 
         try:
-            with ssh:
+            with ssh_pool.acquire(server) as ssh:
                 pg_name = instance.pg_container_name
                 odoo_name = instance.container_name
                 pg_password = instance.pg_password or "odoo"
@@ -62,50 +121,6 @@ def deploy_odoo_instance(self, instance_id: int) -> dict:
 
                 tlog.info("Deploying Odoo %s on %s (port %d)", odoo_version, server.host, host_port)
 
-                # Create directories for persistent data
-                ssh.execute(f"mkdir -p /opt/cloudtab/{odoo_name}/data", timeout=10)
-                ssh.execute(f"mkdir -p /opt/cloudtab/{odoo_name}/addons", timeout=10)
-                ssh.execute(f"mkdir -p /opt/cloudtab/{odoo_name}/config", timeout=10)
-                ssh.execute(f"mkdir -p /opt/cloudtab/{odoo_name}/pgdata", timeout=10)
-
-                # Odoo container runs as uid 101 (odoo user) — fix ownership so it
-                # can write sessions, filestore, etc.
-                ssh.execute(
-                    f"chown -R 101:101 /opt/cloudtab/{odoo_name}/data /opt/cloudtab/{odoo_name}/addons",
-                    timeout=10,
-                )
-
-                # Create Docker network for this instance
-                network_name = f"net-{odoo_name}"
-                ssh.execute(f"docker network create {network_name} 2>/dev/null || true", timeout=15)
-
-                # Stop and remove existing containers if they exist
-                ssh.execute(f"docker stop {odoo_name} 2>/dev/null; docker rm {odoo_name} 2>/dev/null", timeout=30)
-                ssh.execute(f"docker stop {pg_name} 2>/dev/null; docker rm {pg_name} 2>/dev/null", timeout=30)
-
-                # Deploy PostgreSQL container
-                tlog.info("Starting PostgreSQL container %s", pg_name)
-                pg_cmd = (
-                    f"docker run -d"
-                    f" --name {pg_name}"
-                    f" --network {network_name}"
-                    f" --restart unless-stopped"
-                    f" -e POSTGRES_USER=odoo"
-                    f" -e POSTGRES_PASSWORD={pg_password}"
-                    f" -e POSTGRES_DB=postgres"
-                    f" -v /opt/cloudtab/{odoo_name}/pgdata:/var/lib/postgresql/data"
-                    f" postgres:16-alpine"
-                )
-                stdout, stderr, exit_code = ssh.execute(pg_cmd, timeout=120)
-                if exit_code != 0:
-                    raise RuntimeError(f"Failed to start PostgreSQL: {stderr}")
-
-                # Wait for PostgreSQL to be ready
-                ssh.execute(
-                    f"for i in $(seq 1 30); do docker exec {pg_name} pg_isready -U odoo && break; sleep 1; done",
-                    timeout=45,
-                )
-
                 # Build odoo.conf
                 odoo_config_lines = [
                     "[options]",
@@ -113,7 +128,7 @@ def deploy_odoo_instance(self, instance_id: int) -> dict:
                     "db_port = 5432",
                     "db_user = odoo",
                     f"db_password = {pg_password}",
-                    f"addons_path = /mnt/extra-addons",
+                    "addons_path = /mnt/extra-addons",
                     "data_dir = /var/lib/odoo",
                 ]
 
@@ -126,32 +141,71 @@ def deploy_odoo_instance(self, instance_id: int) -> dict:
                     except json.JSONDecodeError:
                         pass
 
-                config_content = "\\n".join(odoo_config_lines)
-                ssh.execute(
-                    f"printf '{config_content}' > /opt/cloudtab/{odoo_name}/config/odoo.conf",
-                    timeout=10,
+                # Prepare the host in one script: create the data directories,
+                # write odoo.conf (from stdin, so values need no shell quoting),
+                # hand data/addons to the Odoo container's uid 101 (odoo user)
+                # so it can write sessions, filestore, etc., create the
+                # instance network and clear out any previous containers.
+                # On a fresh server the Postgres image is pulled alongside
+                # all that instead of by `docker run` afterwards, and the Odoo
+                # image pull is left running detached so it overlaps the
+                # Postgres start; `docker run` joins it if it hasn't finished.
+                paths = InstancePaths.for_container(odoo_name)
+                odoo_image = f"odoo:{odoo_version}"
+                _, stderr, exit_code = ssh.execute_script(
+                    f"(docker image inspect {_PG_IMAGE} > /dev/null 2>&1 "
+                    f"|| docker pull -q {_PG_IMAGE} > /dev/null) &\n"
+                    "pg_pull=$!\n"
+                    f"(docker image inspect {odoo_image} || nohup docker pull -q {odoo_image}) "
+                    "> /dev/null 2>&1 < /dev/null &\n"
+                    f"mkdir -p {paths.data} {paths.addons} {paths.config} {paths.pgdata}\n"
+                    f"cat > {paths.conf}\n"
+                    f"chown -R 101:101 {paths.data} {paths.addons} || true\n"
+                    f"docker network inspect {paths.network} > /dev/null 2>&1 "
+                    f"|| docker network create {paths.network} > /dev/null\n"
+                    f"docker stop {odoo_name} {pg_name} > /dev/null 2>&1 || true\n"
+                    f"docker rm {odoo_name} {pg_name} > /dev/null 2>&1 || true\n"
+                    'wait "$pg_pull"\n',
+                    stdin="\n".join(odoo_config_lines) + "\n",
+                    timeout=300,
                 )
+                if exit_code != 0:
+                    raise RuntimeError(f"Failed to prepare host: {stderr}")
 
-                # Deploy Odoo container
-                tlog.info("Starting Odoo container %s (image odoo:%s)", odoo_name, odoo_version)
-                odoo_image = f"odoo:{odoo_version}"
-                odoo_cmd = (
-                    f"docker run -d"
-                    f" --name {odoo_name}"
-                    f" --network {network_name}"
-                    f" --restart unless-stopped"
-                    f" -p {host_port}:8069"
-                    f" -v /opt/cloudtab/{odoo_name}/data:/var/lib/odoo"
-                    f" -v /opt/cloudtab/{odoo_name}/addons:/mnt/extra-addons"
-                    f" -v /opt/cloudtab/{odoo_name}/config/odoo.conf:/etc/odoo/odoo.conf"
-                    f" {odoo_image}"
+                # Start PostgreSQL, wait (up to 30s) for it to accept
+                # connections, then start Odoo, all in one script
+                tlog.info(
+                    "Starting containers %s and %s (image odoo:%s)",
+                    pg_name, odoo_name, odoo_version,
+                )
+                pg_cmd = _PG_RUN_TEMPLATE.substitute(
+                    pg=pg_name,
+                    network=paths.network,
+                    password=shlex.quote(pg_password),
+                    pgdata=paths.pgdata,
+                )
+                odoo_cmd = _ODOO_RUN_TEMPLATE.substitute(
+                    odoo=odoo_name,
+                    network=paths.network,
+                    port=host_port,
+                    data=paths.data,
+                    addons=paths.addons,
+                    conf=paths.conf,
+                    image=odoo_image,
+                )
+                stdout, stderr, exit_code = ssh.execute_script(
+                    f"{pg_cmd} > /dev/null "
+                    "|| { echo 'Failed to start PostgreSQL' >&2; exit 1; }\n"
+                    + _wait_for_postgres(pg_name, 30)
+                    + f"{odoo_cmd} || {{ echo 'Failed to start Odoo' >&2; exit 1; }}\n",
+                    timeout=345,
                 )
-                stdout, stderr, exit_code = ssh.execute(odoo_cmd, timeout=180)
                 if exit_code != 0:
-                    raise RuntimeError(f"Failed to start Odoo: {stderr}")
+                    raise RuntimeError(f"Failed to start containers: {stderr}")
 
-                # Get container ID
-                container_id_out, _, _ = ssh.execute(f"docker inspect --format='{{{{.Id}}}}' {odoo_name}", timeout=10)
+                # `docker run -d` prints the new container's ID (pull progress
+                # goes to stderr), so no separate `docker inspect` is needed
+                container_id_out = stdout.splitlines()[-1] if stdout else ""
 
                 instance.status = "running"
                 instance.container_id = container_id_out[:12] if container_id_out else None
@@ -187,36 +241,43 @@ def deploy_odoo_instance(self, instance_id: int) -> dict:
     bind=True,
     name="odoo.stop",
     autoretry_for=SSH_RETRYABLE,
+    dont_autoretry_for=SSH_PERMANENT,
     retry_backoff=15,
     retry_backoff_max=120,
+    retry_jitter=True,
     retry_kwargs={"max_retries": 2},
 )
 def stop_odoo_instance(self, instance_id: int) -> dict:
     """Stop an Odoo instance (both Odoo and Postgres containers)."""
     task_id = self.request.id
     tlog = TaskLogger(task_id, instance_id=instance_id)
-    update_task_log(task_id, "running")
+    started_at = datetime.now(UTC)
 
     db = get_sync_db()
     try:
-        ssh, instance, _ = _get_ssh_for_instance(instance_id, db)
+        instance, server = _load_instance(instance_id, db, lean=True)
 
         tlog.info("Stopping instance %s", instance.container_name)
-        with ssh:
-            ssh.execute(f"docker stop {instance.container_name}", timeout=30)
-            ssh.execute(f"docker stop {instance.pg_container_name}", timeout=30)
+        with ssh_pool.acquire(server) as ssh:
+            # One call stops both containers concurrently
+            ssh.execute(
+                f"docker stop {instance.container_name} {instance.pg_container_name}", timeout=30
+            )
 
         instance.status = "stopped"
         db.commit()
 
         result = {"status": "stopped"}
         tlog.info("Instance stopped")
-        update_task_log(task_id, "success", result)
+        update_task_log(task_id, "success", result, started_at=started_at)
         return result
     except Exception as e:
+        if will_retry(self, e):
+            tlog.warning("Stop failed, retrying: %s", e)
+            raise
         result = {"error": str(e)}
         tlog.error("Stop failed: %s", e)
-        update_task_log(task_id, "failed", result)
+        update_task_log(task_id, "failed", result, started_at=started_at)
         return result
     finally:
         db.close()
@@ -226,41 +287,46 @@ def stop_odoo_instance(self, instance_id: int) -> dict:
     bind=True,
     name="odoo.start",
     autoretry_for=SSH_RETRYABLE,
+    dont_autoretry_for=SSH_PERMANENT,
     retry_backoff=15,
     retry_backoff_max=120,
+    retry_jitter=True,
     retry_kwargs={"max_retries": 2},
 )
 def start_odoo_instance(self, instance_id: int) -> dict:
     """Start a stopped Odoo instance."""
     task_id = self.request.id
     tlog = TaskLogger(task_id, instance_id=instance_id)
-    update_task_log(task_id, "running")
+    started_at = datetime.now(UTC)
 
     db = get_sync_db()
     try:
-        ssh, instance, _ = _get_ssh_for_instance(instance_id, db)
+        instance, server = _load_instance(instance_id, db, lean=True)
 
         tlog.info("Starting instance %s", instance.container_name)
-        with ssh:
-            ssh.execute(f"docker start {instance.pg_container_name}", timeout=30)
-            # Wait for PG
-            ssh.execute(
-                f"for i in $(seq 1 15); do docker exec {instance.pg_container_name} pg_isready -U odoo && break; sleep 1; done",
-                timeout=30,
+        with ssh_pool.acquire(server) as ssh:
+            # Start PG, wait for it, then start Odoo, over one channel
+            ssh.execute_script(
+                f"docker start {instance.pg_container_name} > /dev/null || true\n"
+                + _wait_for_postgres(instance.pg_container_name, 15)
+                + f"docker start {instance.container_name} > /dev/null || true\n",
+                timeout=90,
             )
-            ssh.execute(f"docker start {instance.container_name}", timeout=30)
 
         instance.status = "running"
         db.commit()
 
         result = {"status": "running"}
         tlog.info("Instance started")
-        update_task_log(task_id, "success", result)
+        update_task_log(task_id, "success", result, started_at=started_at)
         return result
     except Exception as e:
+        if will_retry(self, e):
+            tlog.warning("Start failed, retrying: %s", e)
+            raise
         result = {"error": str(e)}
         tlog.error("Start failed: %s", e)
-        update_task_log(task_id, "failed", result)
+        update_task_log(task_id, "failed", result, started_at=started_at)
         return result
     finally:
         db.close()
@@ -270,22 +336,24 @@ def start_odoo_instance(self, instance_id: int) -> dict:
     bind=True,
     name="odoo.restart",
     autoretry_for=SSH_RETRYABLE,
+    dont_autoretry_for=SSH_PERMANENT,
     retry_backoff=15,
     retry_backoff_max=120,
+    retry_jitter=True,
     retry_kwargs={"max_retries": 2},
 )
 def restart_odoo_instance(self, instance_id: int) -> dict:
     """Restart an Odoo instance."""
     task_id = self.request.id
     tlog = TaskLogger(task_id, instance_id=instance_id)
-    update_task_log(task_id, "running")
+    started_at = datetime.now(UTC)
 
     db = get_sync_db()
     try:
-        ssh, instance, _ = _get_ssh_for_instance(instance_id, db)
+        instance, server = _load_instance(instance_id, db, lean=True)
 
         tlog.info("Restarting instance %s", instance.container_name)
-        with ssh:
+        with ssh_pool.acquire(server) as ssh:
             ssh.execute(f"docker restart {instance.container_name}", timeout=60)
 
         instance.status = "running"
@@ -293,25 +361,22 @@ def restart_odoo_instance(self, instance_id: int) -> dict:
 
         result = {"status": "running"}
         tlog.info("Instance restarted")
-        update_task_log(task_id, "success", result)
+        update_task_log(task_id, "success", result, started_at=started_at)
         return result
     except Exception as e:
+        if will_retry(self, e):
+            tlog.warning("Restart failed, retrying: %s", e)
+            raise
         result = {"error": str(e)}
         tlog.error("Restart failed: %s", e)
-        update_task_log(task_id, "failed", result)
+        update_task_log(task_id, "failed", result, started_at=started_at)
         return result
     finally:
         db.close()
 
 
-@celery_app.task(
-    bind=True,
-    name="odoo.destroy",
-    autoretry_for=SSH_RETRYABLE,
-    retry_backoff=30,
-    retry_backoff_max=300,
-    retry_kwargs={"max_retries": 2},
-)
+# No autoretry: a half-finished destroy is not safe to re-run from the top
+@celery_app.task(bind=True, name="odoo.destroy")
 def destroy_odoo_instance(self, instance_id: int) -> dict:
     """Stop and remove an Odoo instance's containers, network, and data on the server."""
     task_id = self.request.id
@@ -320,32 +385,27 @@ def destroy_odoo_instance(self, instance_id: int) -> dict:
 
     db = get_sync_db()
     try:
-        ssh, instance, server = _get_ssh_for_instance(instance_id, db)
+        instance, server = _load_instance(instance_id, db)
 
         odoo_name = instance.container_name
         pg_name = instance.pg_container_name
-        network_name = f"net-{odoo_name}"
+        paths = InstancePaths.for_container(odoo_name)
 
         tlog.info("Destroying instance %s on %s", odoo_name, server.host)
 
-        with ssh:
-            # Stop and remove Odoo container
-            ssh.execute(f"docker stop {odoo_name} 2>/dev/null || true", timeout=60)
-            ssh.execute(f"docker rm {odoo_name} 2>/dev/null || true", timeout=30)
-
-            # Stop and remove PostgreSQL container
-            ssh.execute(f"docker stop {pg_name} 2>/dev/null || true", timeout=60)
-            ssh.execute(f"docker rm {pg_name} 2>/dev/null || true", timeout=30)
-
-            # Remove the Docker network
-            ssh.execute(f"docker network rm {network_name} 2>/dev/null || true", timeout=15)
-
-            # Remove data directories (backups are preserved for safety)
-            ssh.execute(f"rm -rf /opt/cloudtab/{odoo_name}/data", timeout=30)
-            ssh.execute(f"rm -rf /opt/cloudtab/{odoo_name}/addons", timeout=30)
-            ssh.execute(f"rm -rf /opt/cloudtab/{odoo_name}/config", timeout=30)
-            ssh.execute(f"rm -rf /opt/cloudtab/{odoo_name}/pgdata", timeout=30)
-            ssh.execute(f"rm -rf /opt/cloudtab/{odoo_name}/repo", timeout=30)
+        with ssh_pool.acquire(server) as ssh:
+            # Force-remove both containers (their data is deleted next, so
+            # there's no point waiting out a graceful stop), then drop the
+            # network and the data directories in parallel so a large pgdata
+            # doesn't hold up the rest; backups are preserved for safety
+            ssh.execute_script(
+                f"docker rm -f {odoo_name} {pg_name} > /dev/null 2>&1 || true\n"
+                f"docker network rm {paths.network} > /dev/null 2>&1 &\n"
+                f"printf '%s\\n' {paths.data} {paths.addons} {paths.config} "
+                f"{paths.pgdata} {paths.repo} | xargs -r -P5 -n1 rm -rf\n"
+                "wait\n",
+                timeout=180,
+            )
 
         # Delete the instance record from DB (cascades to domains, schedules, etc.)
         db.delete(instance)
@@ -373,35 +433,45 @@ def destroy_odoo_instance(self, instance_id: int) -> dict:
     bind=True,
     name="odoo.get_logs",
     autoretry_for=SSH_RETRYABLE,
+    dont_autoretry_for=SSH_PERMANENT,
     retry_backoff=10,
     retry_backoff_max=60,
+    retry_jitter=True,
     retry_kwargs={"max_retries": 2},
 )
 def get_odoo_logs(self, instance_id: int, tail: int = 200) -> dict:
     """Fetch recent logs from an Odoo container."""
     task_id = self.request.id
     tlog = TaskLogger(task_id, instance_id=instance_id)
-    update_task_log(task_id, "running")
+    started_at = datetime.now(UTC)
+    tail = max(1, min(int(tail), _LOGS_MAX_LINES))
 
     db = get_sync_db()
     try:
-        ssh, instance, _ = _get_ssh_for_instance(instance_id, db)
+        instance, server = _load_instance(instance_id, db, lean=True)
 
         tlog.info("Fetching last %d log lines from %s", tail, instance.container_name)
-        with ssh:
+        with ssh_pool.acquire(server) as ssh:
+            # Cap the size on the remote side so a large `tail` can't flood
+            # the channel, worker memory or the stored task result; keep the
+            # newest bytes since those are the ones being looked for
             stdout, stderr, _ = ssh.execute(
-                f"docker logs --tail {tail} {instance.container_name} 2>&1",
+                f"docker logs --tail {tail} {instance.container_name} 2>&1 "
+                f"| tail -c {_LOGS_MAX_BYTES}",
                 timeout=30,
             )
 
         result = {"logs": stdout or stderr}
         tlog.info("Logs fetched (%d chars)", len(result["logs"]))
-        update_task_log(task_id, "success", result)
+        update_task_log(task_id, "success", result, started_at=started_at)
         return result
     except Exception as e:
+        if will_retry(self, e):
+            tlog.warning("Failed to fetch logs, retrying: %s", e)
+            raise
         result = {"error": str(e)}
         tlog.error("Failed to fetch logs: %s", e)
-        update_task_log(task_id, "failed", result)
+        update_task_log(task_id, "failed", result, started_at=started_at)
         return result
     finally:
         db.close()
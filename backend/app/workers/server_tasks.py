@@ -1,23 +1,36 @@
 import logging
-from datetime import UTC, datetime
+from datetime import UTC, datetime, timedelta
+
+from sqlalchemy import func
 
 from app.core.database_sync import get_sync_db
-from app.core.encryption import decrypt_value
+from app.core.encryption import decrypt_value_cached
 from app.models.server import Server
+from app.services import ssh_pool
 from app.services.ssh_service import SSHService
 from app.workers.celery_app import celery_app
-from app.workers.utils import SSH_RETRYABLE, TaskLogger, update_task_log
+from app.workers.utils import (
+    SSH_PERMANENT,
+    SSH_RETRYABLE,
+    TaskLogger,
+    update_task_log,
+    will_retry,
+)
 
 logger = logging.getLogger(__name__)
 
 
+# A successful connection test this recent is reported without a new login
+_CONNECTION_OK_TTL = timedelta(seconds=30)
+
+
 def _get_ssh_service(server: Server) -> SSHService:
     """Create an SSHService from a Server model, decrypting the SSH key."""
     return SSHService(
         host=server.host,
         port=server.port,
         username=server.ssh_user,
-        private_key_pem=decrypt_value(server.ssh_key_encrypted),
+        private_key_pem=decrypt_value_cached(server.ssh_key_encrypted),
     )
 
 
@@ -25,50 +38,71 @@ def _get_ssh_service(server: Server) -> SSHService:
     bind=True,
     name="server.test_connection",
     autoretry_for=SSH_RETRYABLE,
+    dont_autoretry_for=SSH_PERMANENT,
     retry_backoff=10,
     retry_backoff_max=60,
+    retry_jitter=True,
     retry_kwargs={"max_retries": 2},
 )
 def test_server_connection(self, server_id: int) -> dict:
     """Test SSH connectivity to a server."""
     task_id = self.request.id
     tlog = TaskLogger(task_id, server_id=server_id)
-    update_task_log(task_id, "running")
+    started_at = datetime.now(UTC)
 
     db = get_sync_db()
     try:
-        server = db.query(Server).filter(Server.id == server_id).first()
-        if not server:
+        # Freshness is judged by the database clock, the same one that stamps
+        # last_connected_at, so it holds across workers; editing the
+        # connection details resets status and skips it
+        row = (
+            db.query(Server, Server.last_connected_at > func.now() - _CONNECTION_OK_TTL)
+            .filter(Server.id == server_id)
+            .first()
+        )
+        if not row:
             result = {"error": "Server not found"}
             tlog.error("Server %d not found", server_id)
-            update_task_log(task_id, "failed", result)
+            update_task_log(task_id, "failed", result, started_at=started_at)
+            return result
+        server, recently_ok = row
+
+        if server.status == "connected" and recently_ok:
+            result = {"status": "connected", "cached": True}
+            tlog.info("Connection verified within %s, not re-testing", _CONNECTION_OK_TTL)
+            update_task_log(task_id, "success", result, started_at=started_at)
             return result
 
         try:
             tlog.info("Testing SSH connection to %s:%d", server.host, server.port)
+            # Deliberately not pooled: the point is to prove a fresh login works
             with _get_ssh_service(server) as ssh:
                 stdout, _, exit_code = ssh.execute("echo ok")
                 if exit_code == 0 and "ok" in stdout:
                     server.status = "connected"
-                    server.last_connected_at = datetime.now(UTC)
+                    # Stamped by the database so every worker shares one clock
+                    server.last_connected_at = func.now()
                     db.commit()
                     result = {"status": "connected"}
                     tlog.info("Connection successful")
-                    update_task_log(task_id, "success", result)
+                    update_task_log(task_id, "success", result, started_at=started_at)
                     return result
                 else:
                     server.status = "failed"
                     db.commit()
                     result = {"status": "failed", "error": f"Unexpected response: {stdout}"}
                     tlog.warning("Unexpected SSH response: %s", stdout)
-                    update_task_log(task_id, "failed", result)
+                    update_task_log(task_id, "failed", result, started_at=started_at)
                     return result
         except Exception as e:
+            if will_retry(self, e):
+                tlog.warning("SSH connection failed, retrying: %s", e)
+                raise
             server.status = "failed"
             db.commit()
             result = {"status": "failed", "error": str(e)}
             tlog.error("SSH connection failed: %s", e)
-            update_task_log(task_id, "failed", result)
+            update_task_log(task_id, "failed", result, started_at=started_at)
             return result
     finally:
         db.close()
@@ -78,15 +112,17 @@ def test_server_connection(self, server_id: int) -> dict:
     bind=True,
     name="server.get_system_info",
     autoretry_for=SSH_RETRYABLE,
+    dont_autoretry_for=SSH_PERMANENT,
     retry_backoff=15,
     retry_backoff_max=120,
+    retry_jitter=True,
     retry_kwargs={"max_retries": 2},
 )
 def get_system_info(self, server_id: int) -> dict:
     """Gather system information from a server via SSH."""
     task_id = self.request.id
     tlog = TaskLogger(task_id, server_id=server_id)
-    update_task_log(task_id, "running")
+    started_at = datetime.now(UTC)
 
     db = get_sync_db()
     try:
@@ -94,49 +130,68 @@ def get_system_info(self, server_id: int) -> dict:
         if not server:
             result = {"error": "Server not found"}
             tlog.error("Server %d not found", server_id)
-            update_task_log(task_id, "failed", result)
+            update_task_log(task_id, "failed", result, started_at=started_at)
             return result
 
         try:
             tlog.info("Gathering system info from %s", server.host)
-            with _get_ssh_service(server) as ssh:
-                info = {}
-
-                # OS version
-                stdout, _, _ = ssh.execute("cat /etc/os-release | grep PRETTY_NAME | cut -d'=' -f2 | tr -d '\"'")
-                info["os_version"] = stdout or "Unknown"
-
-                # CPU
-                stdout, _, _ = ssh.execute("nproc")
-                info["cpu_cores"] = int(stdout) if stdout.isdigit() else None
-
-                stdout, _, _ = ssh.execute("lscpu | grep 'Model name' | sed 's/Model name:\\s*//'")
-                info["cpu_model"] = stdout or None
-
-                # RAM
-                stdout, _, _ = ssh.execute("free -b | awk '/^Mem:/ {print $2}'")
-                info["ram_total_bytes"] = int(stdout) if stdout.isdigit() else None
-
-                stdout, _, _ = ssh.execute("free -b | awk '/^Mem:/ {print $3}'")
-                info["ram_used_bytes"] = int(stdout) if stdout.isdigit() else None
-
-                # Disk
-                stdout, _, _ = ssh.execute("df -B1 / | awk 'NR==2 {print $2}'")
-                info["disk_total_bytes"] = int(stdout) if stdout.isdigit() else None
-
-                stdout, _, _ = ssh.execute("df -B1 / | awk 'NR==2 {print $3}'")
-                info["disk_used_bytes"] = int(stdout) if stdout.isdigit() else None
+            with ssh_pool.acquire(server) as ssh:
+                # Every probe is independent, so run them over one channel;
+                # raw files and single commands are fetched and parsed here
+                # rather than through remote grep/awk/sed pipelines
+                (
+                    (os_release, _, _),
+                    (cpu_cores, _, _),
+                    (lscpu, _, _),
+                    (meminfo, _, _),
+                    (df, _, _),
+                    (docker, _, docker_exit),
+                    (uptime, _, _),
+                ) = ssh.execute_many([
+                    "cat /etc/os-release",
+                    "nproc",
+                    "lscpu",
+                    "cat /proc/meminfo",
+                    "df -B1 --output=size,used /",
+                    "docker --version 2>/dev/null",
+                    "uptime -s",
+                ])
+
+                os_fields = dict(
+                    line.split("=", 1) for line in os_release.splitlines() if "=" in line
+                )
+                cpu_fields = dict(
+                    map(str.strip, line.split(":", 1))
+                    for line in lscpu.splitlines() if ":" in line
+                )
+                # meminfo values are in kB; "used" matches free(1): total - available
+                mem_kb = {}
+                for line in meminfo.splitlines():
+                    key, _, rest = line.partition(":")
+                    value = rest.split()
+                    if value and value[0].isdigit():
+                        mem_kb[key] = int(value[0])
+                disk = df.splitlines()[-1].split() if df else []
 
-                # Docker
-                stdout, _, exit_code = ssh.execute("docker --version 2>/dev/null")
-                if exit_code == 0 and stdout:
-                    info["docker_version"] = stdout.split(",")[0].replace("Docker version ", "").strip()
+                info = {}
+                info["os_version"] = os_fields.get("PRETTY_NAME", "").strip('"') or "Unknown"
+                info["cpu_cores"] = int(cpu_cores) if cpu_cores.isdigit() else None
+                info["cpu_model"] = cpu_fields.get("Model name") or None
+                if "MemTotal" in mem_kb:
+                    info["ram_total_bytes"] = mem_kb["MemTotal"] * 1024
+                    available = mem_kb.get("MemAvailable", mem_kb.get("MemFree", 0))
+                    info["ram_used_bytes"] = (mem_kb["MemTotal"] - available) * 1024
+                else:
+                    info["ram_total_bytes"] = info["ram_used_bytes"] = None
+                if len(disk) == 2 and all(v.isdigit() for v in disk):
+                    info["disk_total_bytes"], info["disk_used_bytes"] = map(int, disk)
+                else:
+                    info["disk_total_bytes"] = info["disk_used_bytes"] = None
+                if docker_exit == 0 and docker:
+                    info["docker_version"] = docker.split(",")[0].replace("Docker version ", "").strip()
                 else:
                     info["docker_version"] = None
-
-                # Uptime
-                stdout, _, _ = ssh.execute("uptime -s")
-                info["uptime"] = stdout or None
+                info["uptime"] = uptime or None
 
                 # Update server cached info
                 server.os_version = info.get("os_version")
@@ -144,18 +199,22 @@ def get_system_info(self, server_id: int) -> dict:
                 server.ram_total_bytes = info.get("ram_total_bytes")
                 server.disk_total_bytes = info.get("disk_total_bytes")
                 server.docker_version = info.get("docker_version")
+                # last_connected_at is left alone: it records a fresh login,
+                # which a pooled connection doesn't prove
                 server.status = "connected"
-                server.last_connected_at = datetime.now(UTC)
                 db.commit()
 
                 tlog.info("System info collected successfully")
-                update_task_log(task_id, "success", info)
+                update_task_log(task_id, "success", info, started_at=started_at)
                 return info
 
         except Exception as e:
+            if will_retry(self, e):
+                tlog.warning("Failed to gather system info, retrying: %s", e)
+                raise
             result = {"error": str(e)}
             tlog.error("Failed to gather system info: %s", e)
-            update_task_log(task_id, "failed", result)
+            update_task_log(task_id, "failed", result, started_at=started_at)
             return result
     finally:
         db.close()
@@ -165,8 +224,10 @@ def get_system_info(self, server_id: int) -> dict:
     bind=True,
     name="server.install_deps",
     autoretry_for=SSH_RETRYABLE,
+    dont_autoretry_for=SSH_PERMANENT,
     retry_backoff=30,
     retry_backoff_max=300,
+    retry_jitter=True,
     retry_kwargs={"max_retries": 3},
 )
 def install_server_deps(self, server_id: int) -> dict:
@@ -186,41 +247,57 @@ def install_server_deps(self, server_id: int) -> dict:
 
         try:
             tlog.info("Installing dependencies on %s", server.host)
-            with _get_ssh_service(server) as ssh:
-                results = {}
-
-                # Install Docker
-                tlog.info("Installing Docker")
-                _, _, exit_code = ssh.execute(
+            with ssh_pool.acquire(server) as ssh:
+                # One channel for the whole install.  The apt packages go in a
+                # single transaction (apt holds the dpkg lock throughout, so
+                # separate installs could only ever run one after another);
+                # each tool is then checked on its own
+                tlog.info("Installing Docker, Nginx, Certbot and git")
+                (
+                    (_, _, docker_exit),
+                    _,
+                    _,
+                    (_, _, nginx_exit),
+                    (_, _, certbot_exit),
+                    (_, _, git_exit),
+                    (docker_version, _, version_exit),
+                ) = ssh.execute_many([
                     "which docker > /dev/null 2>&1 || (curl -fsSL https://get.docker.com | sh)",
-                    timeout=300,
-                )
-                results["docker_installed"] = exit_code == 0
-
-                # Enable Docker service
-                ssh.execute("systemctl enable --now docker", timeout=30)
-
-                # Install Nginx
-                tlog.info("Installing Nginx")
-                _, _, exit_code = ssh.execute(
-                    "which nginx > /dev/null 2>&1 || apt-get install -y nginx",
-                    timeout=120,
-                )
-                results["nginx_installed"] = exit_code == 0
-
-                # Install Certbot
-                tlog.info("Installing Certbot")
-                _, _, exit_code = ssh.execute(
-                    "which certbot > /dev/null 2>&1 || apt-get install -y certbot python3-certbot-nginx",
-                    timeout=120,
-                )
-                results["certbot_installed"] = exit_code == 0
-
-                # Get Docker version after install
-                stdout, _, exit_code = ssh.execute("docker --version 2>/dev/null")
-                if exit_code == 0:
-                    server.docker_version = stdout.split(",")[0].replace("Docker version ", "").strip()
-                    db.commit()
+                    "systemctl enable --now docker",
+                    (
+                        'pkgs=""\n'
+                        'which nginx > /dev/null 2>&1 || pkgs="$pkgs nginx"\n'
+                        'which certbot > /dev/null 2>&1 '
+                        '|| pkgs="$pkgs certbot python3-certbot-nginx"\n'
+                        # git + rsync are used by git module deploys
+                        '(which git && which rsync) > /dev/null 2>&1 || pkgs="$pkgs git rsync"\n'
+                        # Certbot's packaging can prompt; never let it wait on the channel
+                        '[ -z "$pkgs" ] '
+                        '|| DEBIAN_FRONTEND=noninteractive apt-get install -y $pkgs < /dev/null'
+                    ),
+                    "which nginx",
+                    "which certbot",
+                    "which git && which rsync",
+                    "docker --version 2>/dev/null",
+                ], timeout=720)
+
+                results = {
+                    "docker_installed": docker_exit == 0,
+                    "nginx_installed": nginx_exit == 0,
+                    "certbot_installed": certbot_exit == 0,
+                    "git_installed": git_exit == 0,
+                }
+
+                # Later tasks skip their own install checks once these are set
+                server.has_nginx = results["nginx_installed"]
+                server.has_certbot = results["certbot_installed"]
+                server.has_git = results["git_installed"]
+
+                if version_exit == 0 and docker_version:
+                    server.docker_version = (
+                        docker_version.split(",")[0].replace("Docker version ", "").strip()
+                    )
+                db.commit()
 
                 results["status"] = "completed"
                 tlog.info("Dependency installation complete: %s", results)
@@ -228,6 +305,9 @@ def install_server_deps(self, server_id: int) -> dict:
                 return results
 
         except Exception as e:
+            if will_retry(self, e):
+                tlog.warning("Dependency installation failed, retrying: %s", e)
+                raise
             result = {"error": str(e)}
             tlog.error("Dependency installation failed: %s", e)
             update_task_log(task_id, "failed", result)
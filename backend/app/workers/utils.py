@@ -2,16 +2,18 @@
 
 import json
 import logging
+from dataclasses import dataclass
 from datetime import UTC, datetime
 
 import paramiko
+from sqlalchemy import update
 
 from app.core.database_sync import get_sync_db
 from app.models.task_log import TaskLog
 
 logger = logging.getLogger(__name__)
 
-# Transient SSH exceptions that warrant automatic Celery retry
+# Transient SSH/network exceptions that warrant automatic Celery retry
 SSH_RETRYABLE = (
     paramiko.SSHException,
     ConnectionRefusedError,
@@ -20,34 +22,94 @@ SSH_RETRYABLE = (
     OSError,
 )
 
+# Failures that another attempt won't fix (bad credentials, host key
+# mismatch). Several subclass SSHException, so tasks pass these as
+# ``dont_autoretry_for`` to carve them out of SSH_RETRYABLE.
+SSH_PERMANENT = (
+    paramiko.AuthenticationException,
+    paramiko.BadHostKeyException,
+)
+
+
+def will_retry(task, exc: BaseException) -> bool:
+    """Whether ``task``'s autoretry will run it again after ``exc``.
+
+    Task bodies catch everything to record the failure.  They re-raise when
+    this is true, leaving the task log and row statuses non-terminal while
+    the retry is queued, and record the failure as usual otherwise.
+    """
+    if not isinstance(exc, SSH_RETRYABLE) or isinstance(exc, SSH_PERMANENT):
+        return False
+    max_retries = getattr(task, "retry_kwargs", {}).get("max_retries", task.max_retries)
+    return max_retries is None or task.request.retries < max_retries
+
+
+@dataclass(frozen=True, slots=True)
+class InstancePaths:
+    """Host paths and Docker names for an instance, derived from its container name."""
+
+    root: str
+    data: str
+    addons: str
+    config: str
+    conf: str
+    pgdata: str
+    repo: str
+    backups: str
+    network: str
+
+    @classmethod
+    def for_container(cls, container_name: str) -> "InstancePaths":
+        root = f"/opt/cloudtab/{container_name}"
+        return cls(
+            root=root,
+            data=f"{root}/data",
+            addons=f"{root}/addons",
+            config=f"{root}/config",
+            conf=f"{root}/config/odoo.conf",
+            pgdata=f"{root}/pgdata",
+            repo=f"{root}/repo",
+            backups=f"{root}/backups",
+            network=f"net-{container_name}",
+        )
+
 
 def update_task_log(
     celery_task_id: str,
     status: str,
     result: dict | None = None,
+    started_at: datetime | None = None,
 ) -> None:
     """Update a TaskLog record with current status and optional result.
 
     This is the single shared helper used by all worker tasks to update
     the task_logs table. Having one implementation avoids duplication across
     server_tasks, odoo_tasks, backup_tasks, domain_tasks, and git_tasks.
+
+    Tasks that finish in a few seconds skip the separate "running" write and
+    pass ``started_at`` with their final status instead, so the whole log is
+    recorded in one UPDATE.
     """
+    now = datetime.now(UTC)
+    values: dict = {"status": status}
+    if status == "running":
+        values["started_at"] = now
+    elif started_at is not None:
+        values["started_at"] = started_at
+    if status in ("success", "failed"):
+        values["completed_at"] = now
+    if result is not None:
+        values["result"] = json.dumps(result)
+
+    # A single UPDATE; loading the row first would cost a second round trip
     db = get_sync_db()
     try:
-        task = (
-            db.query(TaskLog)
-            .filter(TaskLog.celery_task_id == celery_task_id)
-            .first()
+        db.execute(
+            update(TaskLog)
+            .where(TaskLog.celery_task_id == celery_task_id)
+            .values(**values)
         )
-        if task:
-            task.status = status
-            if status == "running":
-                task.started_at = datetime.now(UTC)
-            if status in ("success", "failed"):
-                task.completed_at = datetime.now(UTC)
-            if result is not None:
-                task.result = json.dumps(result)
-            db.commit()
+        db.commit()
     except Exception as e:
         logger.error(
             "Failed to update task log %s to status %s: %s",
@@ -68,6 +130,7 @@ class TaskLogger:
     Usage:
         tlog = TaskLogger(task_id="abc123", instance_id=5)
         tlog.info("Starting deploy")
+        tlog.bind(repo_id=3)  # add context once it is known
         tlog.error("Deploy failed: %s", err)
     """
 
@@ -83,29 +146,38 @@ class TaskLogger:
     ):
         self.task_id = task_id
         self._logger = logging.getLogger("app.workers")
+        self._context: dict[str, int] = {}
+        self.bind(
+            server_id=server_id,
+            instance_id=instance_id,
+            domain_id=domain_id,
+            repo_id=repo_id,
+            record_id=record_id,
+        )
 
-        # Build context prefix
-        parts = [f"task={task_id[:12]}"]
-        if server_id is not None:
-            parts.append(f"server={server_id}")
-        if instance_id is not None:
-            parts.append(f"instance={instance_id}")
-        if domain_id is not None:
-            parts.append(f"domain={domain_id}")
-        if repo_id is not None:
-            parts.append(f"repo={repo_id}")
-        if record_id is not None:
-            parts.append(f"record={record_id}")
+    def bind(self, **ids: int | None) -> "TaskLogger":
+        """Add resource identifiers (e.g. ``instance_id=5``) to the prefix in place."""
+        self._context.update({k: v for k, v in ids.items() if v is not None})
+        parts = [f"task={self.task_id[:12]}"]
+        for key in ("server_id", "instance_id", "domain_id", "repo_id", "record_id"):
+            if key in self._context:
+                parts.append(f"{key.removesuffix('_id')}={self._context[key]}")
         self._prefix = "[" + " ".join(parts) + "]"
+        return self
+
+    def _log(self, level: int, msg: str, args: tuple) -> None:
+        # Check the level first so filtered-out lines don't build a string
+        if self._logger.isEnabledFor(level):
+            self._logger.log(level, f"{self._prefix} {msg}", *args)
 
     def info(self, msg: str, *args) -> None:
-        self._logger.info(f"{self._prefix} {msg}", *args)
+        self._log(logging.INFO, msg, args)
 
     def warning(self, msg: str, *args) -> None:
-        self._logger.warning(f"{self._prefix} {msg}", *args)
+        self._log(logging.WARNING, msg, args)
 
     def error(self, msg: str, *args) -> None:
-        self._logger.error(f"{self._prefix} {msg}", *args)
+        self._log(logging.ERROR, msg, args)
 
     def debug(self, msg: str, *args) -> None:
-        self._logger.debug(f"{self._prefix} {msg}", *args)
+        self._log(logging.DEBUG, msg, args)